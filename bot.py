@@ -1,9 +1,25 @@
 """Discord bot initialization and cog loading."""
 import os
 import asyncio
+import logging
+import time
 import discord
 from discord.ext import commands
-from utils.config import BOT_PREFIX, get_bot_intents, DISCORD_TOKEN
+from utils.config import BOT_PREFIX, LEAN_CACHE, get_bot_intents, get_cache_options, DISCORD_TOKEN, AUDIO_WORKERS
+from utils.audio_workers import AudioWorkerPool
+from utils.extractors import ExtractorRouter
+from utils.loudness import LoudnessAnalyzer
+from utils.playback import create_backend
+from utils.settings import SettingsStore
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+def get_guild_prefix(bot, message):
+    """Command prefix for a message: the guild's configured prefix, or a mention of the bot."""
+    prefix = bot.settings.get(message.guild.id).prefix if message.guild else BOT_PREFIX
+    return commands.when_mentioned_or(prefix)(bot, message)
 
 
 class MusicBot(commands.Bot):
@@ -11,34 +27,81 @@ class MusicBot(commands.Bot):
     
     def __init__(self):
         super().__init__(
-            command_prefix=BOT_PREFIX,
+            command_prefix=get_guild_prefix,
             intents=get_bot_intents(),
-            help_command=None  # We'll create a custom help command
+            help_command=None,  # We'll create a custom help command
+            **get_cache_options()
         )
+        self.created_at = time.perf_counter()
+        self.ready_seconds = None  # Time from start-up to the first on_ready
         self.music_players = {}  # Dictionary to store music players per guild
+        self.settings = SettingsStore()
+        self.extractors = ExtractorRouter()  # yt-dlp instances shared by every guild
+        self.audio_pool = None  # AudioWorkerPool when AUDIO_WORKERS > 0
+        self.playback_backend = create_backend(self)
+        # Loudness normalization happens in FFmpeg, so only the in-process backend uses it
+        self.loudness = LoudnessAnalyzer() if self.playback_backend.name == 'ffmpeg' else None
     
     async def setup_hook(self):
-        """Load all cogs when the bot starts."""
+        """Load guild settings, start the playback backend and load all cogs when the bot starts."""
+        await self.settings.start()
+        if AUDIO_WORKERS > 0 and self.playback_backend.name == 'ffmpeg':
+            self.audio_pool = AudioWorkerPool(AUDIO_WORKERS)
+            await asyncio.to_thread(self.audio_pool.start)
+        await self.playback_backend.start()
         await self.load_cogs()
     
+    async def close(self):
+        """Shut down the playback backend and audio workers and save settings along with the bot."""
+        # Stop players before their voice clients disconnect, as !leave does
+        for player in self.music_players.values():
+            player.stop()
+        await super().close()
+        await self.playback_backend.close()
+        await self.settings.close()
+        if self.loudness:
+            await self.loudness.close()
+        if self.audio_pool:
+            await asyncio.to_thread(self.audio_pool.shutdown)
+            self.audio_pool = None
+    
     async def load_cogs(self):
         """Dynamically load all cogs from the cogs directory."""
         for filename in os.listdir('./cogs'):
             if filename.endswith('.py') and not filename.startswith('__'):
                 try:
                     await self.load_extension(f'cogs.{filename[:-3]}')
-                    print(f'✓ Loaded cog: {filename[:-3]}')
+                    logger.info('✓ Loaded cog: %s', filename[:-3])
                 except Exception as e:
-                    print(f'✗ Failed to load cog {filename[:-3]}: {e}')
+                    logger.exception('✗ Failed to load cog %s: %s', filename[:-3], e)
+    
+    async def invoke(self, ctx):
+        """Invoke a command inside a sampled trace."""
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        
+        with tracer.trace(
+            f'command:{ctx.command.qualified_name}',
+            guild_id=ctx.guild.id if ctx.guild else None,
+            args=ctx.message.content[:200]
+        ) as trace:
+            if trace:
+                # Time from the message being sent until the command starts running
+                dispatch = (discord.utils.utcnow() - ctx.message.created_at).total_seconds()
+                trace.add_span('dispatch', offset=-dispatch, duration=dispatch)
+            await super().invoke(ctx)
     
     async def on_ready(self):
         """Event handler for when the bot is ready."""
-        print(f'\n{"="*50}')
-        print(f'Bot is ready!')
-        print(f'Logged in as: {self.user.name} (ID: {self.user.id})')
-        print(f'Connected to {len(self.guilds)} guild(s)')
-        print(f'Command prefix: {BOT_PREFIX}')
-        print(f'{"="*50}\n')
+        if self.ready_seconds is None:
+            self.ready_seconds = time.perf_counter() - self.created_at
+        logger.info(
+            'Bot is ready! Logged in as: %s (ID: %s) | Connected to %d guild(s) | Command prefix: %s | '
+            'Ready in %.1fs (%s cache)',
+            self.user.name, self.user.id, len(self.guilds), BOT_PREFIX,
+            self.ready_seconds, 'lean' if LEAN_CACHE else 'default',
+            extra={'guild_count': len(self.guilds), 'ready_seconds': self.ready_seconds}
+        )
         
         # Set bot status
         await self.change_presence(
@@ -51,16 +114,20 @@ class MusicBot(commands.Bot):
     async def on_command_error(self, ctx, error):
         """Global error handler for commands."""
         if isinstance(error, commands.CommandNotFound):
-            await ctx.send(f"❌ Command not found. Use `{BOT_PREFIX}help` to see available commands.")
+            await ctx.send(f"❌ Command not found. Use `{ctx.clean_prefix}help` to see available commands.")
         elif isinstance(error, commands.MissingRequiredArgument):
             await ctx.send(f"❌ Missing required argument: `{error.param.name}`")
+        elif isinstance(error, commands.MissingPermissions):
+            missing = ', '.join(p.replace('_', ' ').title() for p in error.missing_permissions)
+            await ctx.send(f"❌ You need the {missing} permission to use this command.")
         elif isinstance(error, commands.CheckFailure):
             # Check failures are handled in the checks themselves
             pass
         elif isinstance(error, commands.CommandOnCooldown):
             await ctx.send(f"⏰ This command is on cooldown. Try again in {error.retry_after:.1f}s")
         else:
-            print(f'Error in command {ctx.command}: {error}')
+            logger.error('Error in command %s: %s', ctx.command, error,
+                         exc_info=getattr(error, 'original', error))
             await ctx.send(f"❌ An error occurred: {str(error)}")
     
     async def on_voice_state_update(self, member, before, after):
@@ -72,13 +139,16 @@ class MusicBot(commands.Bot):
         if before.channel and self.user in before.channel.members:
             if len(before.channel.members) == 1:  # Only bot left
                 voice_client = discord.utils.get(self.voice_clients, guild=member.guild)
-                if voice_client:
-                    # Stop playing and disconnect after 3 minutes of being alone
-                    await asyncio.sleep(180)
+                idle_timeout = self.settings.get(member.guild.id).idle_timeout
+                if voice_client and idle_timeout:
+                    # Stop playing and disconnect after the guild's idle timeout
+                    await asyncio.sleep(idle_timeout)
                     if voice_client.channel and len(voice_client.channel.members) == 1:
+                        # Stop the player first, as !leave does, so it doesn't treat the disconnect as a dropped stream
+                        player = self.music_players.pop(member.guild.id, None)
+                        if player:
+                            player.stop()
                         await voice_client.disconnect()
-                        if member.guild.id in self.music_players:
-                            del self.music_players[member.guild.id]
 
 
 def create_bot():
@@ -0,0 +1,159 @@
+"""Owner-only diagnostics commands for the Discord bot."""
+import discord
+from discord.ext import commands
+from utils.config import LEAN_CACHE
+from utils.memory import cache_counts, peak_rss_mb, rss_mb
+from utils.reload import ReloadError, reload_code
+from utils.tracing import tracer
+
+
+class Admin(commands.Cog):
+    """Owner-only commands for inspecting the running bot."""
+    
+    def __init__(self, bot):
+        self.bot = bot
+    
+    async def cog_check(self, ctx):
+        """Restrict every command in this cog to the bot owner."""
+        if not await self.bot.is_owner(ctx.author):
+            raise commands.NotOwner()
+        return True
+    
+    @commands.command(name='traces')
+    async def traces(self, ctx, count: int = 5):
+        """Show the slowest recent traces broken down by stage."""
+        slowest = tracer.slowest(max(1, min(count, 10)))
+        
+        if not slowest:
+            await ctx.send(
+                f"📭 No traces recorded yet (sample rate: {tracer.sample_rate:.0%})."
+            )
+            return
+        
+        embed = discord.Embed(
+            title="🐢 Slowest Recent Traces",
+            description=f"{len(tracer.recent)} trace(s) kept | sample rate {tracer.sample_rate:.0%}",
+            color=discord.Color.orange()
+        )
+        
+        for trace in slowest:
+            stages = sorted(trace.stage_totals().items(), key=lambda item: item[1], reverse=True)
+            breakdown = "\n".join(
+                f"`{name:<17}` {seconds * 1000:>8.0f} ms" for name, seconds in stages[:8]
+            )
+            embed.add_field(
+                name=f"{trace.name} - {trace.duration * 1000:.0f} ms (`{trace.trace_id}`)",
+                value=breakdown or "No stages recorded",
+                inline=False
+            )
+        
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='workers')
+    async def workers(self, ctx):
+        """Show load metrics for the audio worker processes."""
+        if not self.bot.audio_pool:
+            await ctx.send("ℹ️ Audio worker pool is disabled (`AUDIO_WORKERS=0`); audio is encoded in-process.")
+            return
+        
+        embed = discord.Embed(
+            title="🎛️ Audio Workers",
+            color=discord.Color.blue()
+        )
+        
+        for stats in self.bot.audio_pool.stats():
+            status = "🟢" if stats['alive'] else "🔴"
+            embed.add_field(
+                name=f"{status} Worker {stats['worker']} (pid {stats['pid']})",
+                value=f"Sessions: {stats['sessions']}\n"
+                      f"Frames: {stats['frames_received']}\n"
+                      f"Encode: {stats['encode_seconds']:.1f}s | CPU: {stats['cpu_seconds']:.1f}s",
+                inline=True
+            )
+        
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='routes')
+    async def routes(self, ctx):
+        """Show extraction latency for each extractor route."""
+        summary = self.bot.extractors.stats_summary()
+        if not summary:
+            await ctx.send("📭 No extractions recorded yet.")
+            return
+        
+        lines = [f"{'route':<24} {'count':>6} {'err':>4} {'p50':>8} {'p95':>8}"]
+        for route, stats in summary.items():
+            lines.append(
+                f"{route:<24} {stats['count']:>6} {stats['errors']:>4} "
+                f"{stats['p50'] * 1000:>6.0f}ms {stats['p95'] * 1000:>6.0f}ms"
+            )
+        
+        embed = discord.Embed(
+            title="🧭 Extractor Routes",
+            description="```\n" + "\n".join(lines) + "\n```",
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text="<route>:stream = stream URL resolution at playback")
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='memstats')
+    async def memstats(self, ctx):
+        """Show memory use, start-up time and gateway cache sizes."""
+        ready = self.bot.ready_seconds
+        rss = rss_mb()
+        embed = discord.Embed(
+            title="🧠 Memory and Cache",
+            description=f"Cache profile: **{'lean' if LEAN_CACHE else 'default'}** | "
+                        f"intents value `{self.bot.intents.value}`",
+            color=discord.Color.blue()
+        )
+        embed.add_field(
+            name="Process",
+            value=f"RSS: {rss:.1f} MB\n"
+                  f"Peak RSS: {max(peak_rss_mb(), rss):.1f} MB\n"
+                  f"Ready in: {f'{ready:.1f}s' if ready is not None else '-'}",
+            inline=True
+        )
+        counts = cache_counts(self.bot)
+        embed.add_field(
+            name="Gateway cache",
+            value="\n".join(f"{kind.title()}: {count:,}" for kind, count in counts.items()),
+            inline=True
+        )
+        embed.add_field(
+            name="Playback",
+            value=f"Voice clients: {len(self.bot.voice_clients)}\n"
+                  f"Players: {len(self.bot.music_players)}",
+            inline=True
+        )
+        embed.set_footer(text="Set LEAN_CACHE=true to trim intents and caches for large guild counts")
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='reload')
+    async def reload(self, ctx):
+        """Reload cogs and player code in place, keeping voice sessions and queues."""
+        try:
+            report = await reload_code(self.bot)
+        except ReloadError as e:
+            await ctx.send(f"❌ Reload failed in `{e.module}`, nothing changed:\n```{e.error}```")
+            return
+        
+        embed = discord.Embed(
+            title="♻️ Code Reloaded",
+            description=f"Done in {report['seconds'] * 1000:.0f} ms | "
+                        f"{len(self.bot.music_players)} player(s) kept",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="Modules", value="\n".join(report['modules']) or "-", inline=True)
+        embed.add_field(name="Cogs", value="\n".join(report['cogs']) or "-", inline=True)
+        migrated = "\n".join(f"{name}: {count}" for name, count in sorted(report['migrated'].items()))
+        embed.add_field(name="Migrated objects", value=migrated or "-", inline=False)
+        if report['failed']:
+            failed = "\n".join(f"{name}: {count}" for name, count in sorted(report['failed'].items()))
+            embed.add_field(name="⚠️ Kept old code", value=failed, inline=False)
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    """Setup function to add the cog to the bot."""
+    await bot.add_cog(Admin(bot))
@@ -10,6 +10,12 @@ class General(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
+    def guild_prefix(self, ctx) -> str:
+        """The command prefix configured for the context's guild."""
+        if ctx.guild:
+            return self.bot.settings.get(ctx.guild.id).prefix
+        return BOT_PREFIX
+    
     @commands.command(name='ping')
     async def ping(self, ctx):
         """Check the bot's latency."""
@@ -25,18 +31,19 @@ class General(commands.Cog):
     @commands.command(name='help')
     async def help(self, ctx, command_name: str = None):
         """Display help information for commands."""
+        prefix = self.guild_prefix(ctx)
         if command_name:
             # Show help for specific command
             command = self.bot.get_command(command_name)
             if command:
                 embed = discord.Embed(
-                    title=f"Help: {BOT_PREFIX}{command.name}",
+                    title=f"Help: {prefix}{command.name}",
                     description=command.help or "No description available.",
                     color=discord.Color.blue()
                 )
                 embed.add_field(
                     name="Usage",
-                    value=f"`{BOT_PREFIX}{command.name} {command.signature}`",
+                    value=f"`{prefix}{command.name} {command.signature}`",
                     inline=False
                 )
                 await ctx.send(embed=embed)
@@ -46,22 +53,26 @@ class General(commands.Cog):
             # Show general help
             embed = discord.Embed(
                 title="🎵 Discord Music Bot - Help",
-                description=f"Use `{BOT_PREFIX}help <command>` for more info on a command.",
+                description=f"Use `{prefix}help <command>` for more info on a command.",
                 color=discord.Color.blue()
             )
             
             # Music commands
             music_commands = [
-                f"`{BOT_PREFIX}play <url/query>` - Play music from URL or search",
-                f"`{BOT_PREFIX}pause` - Pause the current track",
-                f"`{BOT_PREFIX}resume` - Resume playback",
-                f"`{BOT_PREFIX}skip` - Skip to the next track",
-                f"`{BOT_PREFIX}stop` - Stop playback and clear queue",
-                f"`{BOT_PREFIX}queue` - Display the current queue",
-                f"`{BOT_PREFIX}nowplaying` - Show the current track",
-                f"`{BOT_PREFIX}clear` - Clear the queue",
-                f"`{BOT_PREFIX}leave` - Disconnect the bot from voice",
-                f"`{BOT_PREFIX}volume [0-100]` - Set or show volume",
+                f"`{prefix}play <url/query>` - Play music from URL or search",
+                f"`{prefix}pause` - Pause the current track",
+                f"`{prefix}resume` - Resume playback",
+                f"`{prefix}skip` - Skip to the next track",
+                f"`{prefix}seek <position>` - Jump to a position in the track",
+                f"`{prefix}merge <playlist>` - Add only tracks not already queued",
+                f"`{prefix}stop` - Stop playback and clear queue",
+                f"`{prefix}queue` - Display the current queue",
+                f"`{prefix}nowplaying` - Show the current track",
+                f"`{prefix}clear` - Clear the queue",
+                f"`{prefix}dedupe [on|off]` - Remove duplicates / set the no-duplicates policy",
+                f"`{prefix}fair [on|off]` - Take turns between requesters",
+                f"`{prefix}leave` - Disconnect the bot from voice",
+                f"`{prefix}volume [0-100]` - Set or show volume",
             ]
             embed.add_field(
                 name="🎵 Music Commands",
@@ -71,8 +82,10 @@ class General(commands.Cog):
             
             # General commands
             general_commands = [
-                f"`{BOT_PREFIX}ping` - Check bot latency",
-                f"`{BOT_PREFIX}help` - Show this help message",
+                f"`{prefix}ping` - Check bot latency",
+                f"`{prefix}help` - Show this help message",
+                f"`{prefix}settings` - Show server settings (Manage Server)",
+                f"`{prefix}set <name> <value>` - Change a server setting (Manage Server)",
             ]
             embed.add_field(
                 name="⚙️ General Commands",
@@ -118,7 +131,7 @@ class General(commands.Cog):
         )
         
         embed.add_field(name="Servers", value=str(len(self.bot.guilds)), inline=True)
-        embed.add_field(name="Prefix", value=BOT_PREFIX, inline=True)
+        embed.add_field(name="Prefix", value=self.guild_prefix(ctx), inline=True)
         embed.add_field(
             name="Features",
             value="• Play music from SoundCloud & YouTube\n• Queue management\n• Basic playback controls",
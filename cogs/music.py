@@ -1,8 +1,9 @@
 """Music commands cog for the Discord bot."""
 import discord
 from discord.ext import commands
-from utils.music_player import MusicPlayer
-from utils.checks import is_in_voice_channel, is_in_same_voice_channel
+from utils.music_player import MusicPlayer, format_time
+from utils.checks import can_manage_settings, is_in_voice_channel, is_in_same_voice_channel
+from utils.tracing import span
 
 
 class Music(commands.Cog):
@@ -25,15 +26,31 @@ class Music(commands.Cog):
         Supports SoundCloud, YouTube, and many other platforms.
         You can provide a direct URL or a search query.
         """
+        await self._enqueue(ctx, query)
+    
+    @commands.command(name='merge')
+    @is_in_voice_channel()
+    async def merge(self, ctx, *, query: str):
+        """Add a playlist, skipping tracks that are already queued.
+        
+        Known entries are skipped before they are extracted.
+        """
+        await self._enqueue(ctx, query, allow_duplicates=False)
+    
+    async def _enqueue(self, ctx, query: str, allow_duplicates=None):
+        """Connect if needed, add the query's track(s) and start playback."""
         # Connect to voice channel if not already connected
-        if not ctx.voice_client:
-            try:
-                await ctx.author.voice.channel.connect()
-            except Exception as e:
-                await ctx.send(f"❌ Failed to connect to voice channel: {str(e)}")
-                return
-        elif ctx.voice_client.channel != ctx.author.voice.channel:
-            await ctx.voice_client.move_to(ctx.author.voice.channel)
+        with span('voice_connect'):
+            if not ctx.voice_client:
+                try:
+                    await ctx.author.voice.channel.connect(
+                        cls=self.bot.playback_backend.voice_client_class
+                    )
+                except Exception as e:
+                    await ctx.send(f"❌ Failed to connect to voice channel: {str(e)}")
+                    return
+            elif ctx.voice_client.channel != ctx.author.voice.channel:
+                await ctx.voice_client.move_to(ctx.author.voice.channel)
         
         # Get the music player for this guild
         player = self.get_player(ctx)
@@ -44,9 +61,16 @@ class Music(commands.Cog):
         loading_msg = await ctx.send("🔍 Searching and loading track...")
         
         # Add track(s) to queue
-        result = await player.add_track(query, ctx.author)
+        result = await player.add_track(query, ctx.author, allow_duplicates=allow_duplicates)
         
-        if result:
+        if result and not result['tracks']:
+            if result['full']:
+                await loading_msg.edit(
+                    content=f"❌ The queue is full ({player.settings.max_queue} tracks max)."
+                )
+            else:
+                await loading_msg.edit(content=f"⏭️ Already in the queue, skipped {result['skipped']} track(s).")
+        elif result:
             # Delete loading message
             await loading_msg.delete()
             
@@ -91,7 +115,16 @@ class Music(commands.Cog):
                 if tracks[0].thumbnail:
                     embed.set_thumbnail(url=tracks[0].thumbnail)
                 
-                embed.set_footer(text="Use !queue to see the full queue")
+                if result['skipped']:
+                    embed.add_field(name="Skipped", value=f"{result['skipped']} already queued", inline=True)
+                if result['full']:
+                    embed.add_field(
+                        name="Queue full",
+                        value=f"Stopped at the {player.settings.max_queue} track limit",
+                        inline=True
+                    )
+                
+                embed.set_footer(text=f"Use {ctx.clean_prefix}queue to see the full queue")
                 await ctx.send(embed=embed)
             else:
                 # Single track
@@ -104,7 +137,10 @@ class Music(commands.Cog):
                         color=discord.Color.blue()
                     )
                     embed.add_field(name="Duration", value=track.format_duration(), inline=True)
-                    embed.add_field(name="Position in queue", value=str(len(player.queue)), inline=True)
+                    position, wait = player.queue_position(track)
+                    embed.add_field(name="Position in queue", value=str(position or len(player.queue)), inline=True)
+                    if wait is not None:
+                        embed.add_field(name="Plays in", value=format_time(wait), inline=True)
                     embed.add_field(name="Requested by", value=ctx.author.mention, inline=True)
                     if track.thumbnail:
                         embed.set_thumbnail(url=track.thumbnail)
@@ -145,6 +181,35 @@ class Music(commands.Cog):
         else:
             await ctx.send("❌ Nothing is currently playing.")
     
+    @commands.command(name='seek')
+    @is_in_same_voice_channel()
+    async def seek(self, ctx, position: str):
+        """Jump to a position in the current track (seconds, MM:SS or HH:MM:SS)."""
+        player = self.get_player(ctx)
+        
+        if not player.current:
+            await ctx.send("❌ Nothing is currently playing.")
+            return
+        
+        try:
+            seconds = 0
+            for part in position.split(':'):
+                seconds = seconds * 60 + int(part)
+        except ValueError:
+            await ctx.send("❌ Invalid position. Use seconds, `MM:SS` or `HH:MM:SS`.")
+            return
+        
+        try:
+            moved = await player.seek(seconds)
+        except Exception as e:
+            await ctx.send(f"❌ Failed to seek: {str(e)}")
+            return
+        
+        if moved:
+            await ctx.send(f"⏩ Seeked to {format_time(seconds)}.")
+        else:
+            await ctx.send(f"❌ Position is past the end of the track ({player.current.format_duration()}).")
+    
     @commands.command(name='stop')
     @is_in_same_voice_channel()
     async def stop(self, ctx):
@@ -160,7 +225,7 @@ class Music(commands.Cog):
         player = self.get_player(ctx)
         
         if not player.current and len(player.queue) == 0:
-            await ctx.send("📭 The queue is empty. Use `!play` to add music!")
+            await ctx.send(f"📭 The queue is empty. Use `{ctx.clean_prefix}play` to add music!")
             return
         
         embed = discord.Embed(
@@ -181,14 +246,17 @@ class Music(commands.Cog):
         # Show upcoming tracks
         if len(player.queue) > 0:
             queue_text = []
-            for i, track in enumerate(player.queue[:10], 1):  # Show first 10 tracks
+            # Show the first 10 tracks in the order they will play
+            for i, (track, wait) in enumerate(player.upcoming(10), 1):
+                eta = f" - in {format_time(wait)}" if wait is not None else ""
                 queue_text.append(
                     f"`{i}.` [{track.title}]({track.webpage_url}) "
-                    f"[{track.format_duration()}]"
+                    f"[{track.format_duration()}]{eta}"
                 )
             
+            mode = " - fair share" if player.fair_share else ""
             embed.add_field(
-                name=f"📋 Up Next ({len(player.queue)} tracks)",
+                name=f"📋 Up Next ({len(player.queue)} tracks{mode})",
                 value="\n".join(queue_text),
                 inline=False
             )
@@ -213,7 +281,11 @@ class Music(commands.Cog):
             color=discord.Color.green()
         )
         
-        embed.add_field(name="Duration", value=player.current.format_duration(), inline=True)
+        embed.add_field(
+            name="Position",
+            value=f"{format_time(player.position)} / {player.current.format_duration()}",
+            inline=True
+        )
         embed.add_field(name="Requested by", value=player.current.requester.mention, inline=True)
         
         if player.current.thumbnail:
@@ -243,6 +315,89 @@ class Music(commands.Cog):
         player.clear_queue()
         await ctx.send(f"🗑️ Cleared {queue_length} track(s) from the queue.")
     
+    @commands.command(name='dedupe')
+    @is_in_same_voice_channel()
+    async def dedupe(self, ctx, mode: str = None):
+        """Remove duplicate tracks, or turn the no-duplicates policy on/off."""
+        player = self.get_player(ctx)
+        
+        if mode is None:
+            removed = player.remove_duplicates()
+            if removed:
+                await ctx.send(f"🧹 Removed {removed} duplicate track(s) from the queue.")
+            else:
+                await ctx.send("✅ The queue has no duplicates.")
+            return
+        
+        mode = mode.lower()
+        if mode not in ('on', 'off'):
+            await ctx.send(f"❌ Usage: `{ctx.clean_prefix}dedupe [on|off]`")
+            return
+        
+        if not await can_manage_settings(ctx):
+            await ctx.send("❌ You need the Manage Server permission to change the duplicates policy.")
+            return
+        
+        # Stored as the server's 'dedupe' setting, the same one !set changes
+        settings = self.bot.settings.update(ctx.guild.id, dedupe=mode == 'on')
+        player.apply_settings(settings, names=('dedupe',))
+        if mode == 'on':
+            removed = player.remove_duplicates()
+            await ctx.send(f"🧹 Duplicates will be skipped from now on (removed {removed} already queued).")
+        else:
+            await ctx.send("🔁 Duplicate tracks are allowed again.")
+    
+    @commands.command(name='fair')
+    @is_in_same_voice_channel()
+    async def fair(self, ctx, mode: str = None):
+        """Turn fair-share scheduling across requesters on/off."""
+        player = self.get_player(ctx)
+        
+        if mode is None:
+            state = "on" if player.fair_share else "off"
+            await ctx.send(f"⚖️ Fair-share queue is **{state}**. Use `{ctx.clean_prefix}fair on` or `{ctx.clean_prefix}fair off` to change it.")
+            return
+        
+        mode = mode.lower()
+        if mode not in ('on', 'off'):
+            await ctx.send(f"❌ Usage: `{ctx.clean_prefix}fair [on|off]`")
+            return
+        
+        if not await can_manage_settings(ctx):
+            await ctx.send("❌ You need the Manage Server permission to change the queue order.")
+            return
+        
+        # Stored as the server's 'fair_share' setting, the same one !set changes
+        settings = self.bot.settings.update(ctx.guild.id, fair_share=mode == 'on')
+        player.apply_settings(settings, names=('fair_share',))
+        if mode == 'on':
+            await ctx.send("⚖️ Fair-share queue enabled: requesters now take turns.")
+        else:
+            await ctx.send("📋 Fair-share queue disabled: tracks play in the order they were added.")
+    
+    @commands.command(name='fairweight')
+    @commands.guild_only()
+    async def fairweight(self, ctx, member: discord.Member, weight: int):
+        """Give a member more turns in the fair-share queue (1-10)."""
+        if not await can_manage_settings(ctx):
+            await ctx.send("❌ You need the Manage Server permission to change fair-share weights.")
+            return
+        if not 1 <= weight <= 10:
+            await ctx.send("❌ Weight must be between 1 and 10.")
+            return
+        
+        # Saved with the server's settings, so weights outlive the player
+        weights = dict(self.bot.settings.get(ctx.guild.id).fair_weights)
+        if weight == 1:
+            weights.pop(member.id, None)
+        else:
+            weights[member.id] = weight
+        settings = self.bot.settings.update(ctx.guild.id, fair_weights=weights)
+        player = self.bot.music_players.get(ctx.guild.id)
+        if player:
+            player.apply_settings(settings, names=('fair_weights',))
+        await ctx.send(f"⚖️ {member.mention} now gets {weight} turn(s) per round in the fair-share queue.")
+    
     @commands.command(name='leave', aliases=['disconnect', 'dc'])
     @is_in_same_voice_channel()
     async def leave(self, ctx):
@@ -282,7 +437,15 @@ class Music(commands.Cog):
             await ctx.send("❌ Volume must be between 0 and 100.")
             return
         
-        if ctx.voice_client.source:
+        player = self.bot.music_players.get(ctx.guild.id)
+        if player and player.source:
+            try:
+                await player.set_volume(volume / 100)
+            except Exception as e:
+                await ctx.send(f"❌ Failed to change volume: {str(e)}")
+                return
+            await ctx.send(f"🔊 Volume set to {volume}%")
+        elif ctx.voice_client.source:
             ctx.voice_client.source.volume = volume / 100
             await ctx.send(f"🔊 Volume set to {volume}%")
         else:
@@ -0,0 +1,76 @@
+"""Per-guild settings commands for the Discord bot."""
+import discord
+from discord.ext import commands
+from utils.checks import can_manage_settings
+from utils.settings import GuildSettings, parse_setting
+
+
+class Settings(commands.Cog):
+    """View and change this server's bot settings."""
+    
+    def __init__(self, bot):
+        self.bot = bot
+    
+    async def cog_check(self, ctx):
+        """Restrict settings to server managers and the bot owner."""
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        if await can_manage_settings(ctx):
+            return True
+        raise commands.MissingPermissions(['manage_guild'])
+    
+    @staticmethod
+    def format_value(value) -> str:
+        if isinstance(value, bool):
+            return "on" if value else "off"
+        return str(value)
+    
+    @commands.command(name='settings')
+    async def settings(self, ctx):
+        """Show this server's settings."""
+        settings = self.bot.settings.get(ctx.guild.id)
+        defaults = self.bot.settings.defaults
+        
+        lines = []
+        for name, (_, description) in GuildSettings.FIELDS.items():
+            value = getattr(settings, name)
+            changed = "" if value == getattr(defaults, name) else " ✏️"
+            lines.append(f"`{name}` = **{self.format_value(value)}**{changed}\n{description}")
+        
+        embed = discord.Embed(
+            title=f"⚙️ Settings for {ctx.guild.name}",
+            description="\n".join(lines),
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"Change with {ctx.clean_prefix}set <name> <value> ('default' to reset)")
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='set')
+    async def set_setting(self, ctx, name: str, *, value: str):
+        """Change a setting, or reset it with 'default'."""
+        name = name.lower()
+        if name not in GuildSettings.FIELDS:
+            await ctx.send(f"❌ Unknown setting `{name}`. Available: {', '.join(GuildSettings.FIELDS)}")
+            return
+        
+        if value.lower() == 'default':
+            settings = self.bot.settings.reset(ctx.guild.id, name)
+        else:
+            try:
+                parsed = parse_setting(name, value)
+            except ValueError as e:
+                await ctx.send(f"❌ Invalid value for `{name}`: {e}")
+                return
+            settings = self.bot.settings.update(ctx.guild.id, **{name: parsed})
+        
+        # Queue policies apply to the running player straight away
+        player = self.bot.music_players.get(ctx.guild.id)
+        if player:
+            player.apply_settings(settings, names=(name,))
+        
+        await ctx.send(f"✅ `{name}` set to **{self.format_value(getattr(settings, name))}**")
+
+
+async def setup(bot):
+    """Setup function to add the cog to the bot."""
+    await bot.add_cog(Settings(bot))
@@ -1,32 +1,38 @@
 """Main entry point for the Discord music bot."""
 import os
+import logging
 from bot import create_bot
 from utils.config import DISCORD_TOKEN
+from utils.log import setup_logging
+
+logger = logging.getLogger(__name__)
 
 
 def main():
     """Main function to run the bot."""
+    setup_logging()
     try:
         # Start HTTP server if PORT is set (for Render web service)
         if os.environ.get('PORT'):
             import server
             port = int(os.environ.get('PORT', 10000))
             server.start_server(port)
-            print(f"✓ Health check server started on port {port}")
+            logger.info("✓ Health check server started on port %d", port)
         
-        # Start Discord bot
+        # Start Discord bot (logging is already configured, so skip discord.py's own handler)
         bot = create_bot()
-        bot.run(DISCORD_TOKEN)
+        bot.run(DISCORD_TOKEN, log_handler=None)
     except ValueError as e:
-        print(f"\n❌ Configuration Error: {e}")
-        print("\nPlease ensure you have:")
-        print("1. Created a .env file in the project root")
-        print("2. Added your Discord bot token: DISCORD_TOKEN=your_token_here")
-        print("\nFor help setting up your bot, see the README.md file.\n")
+        logger.error(
+            "❌ Configuration Error: %s\n"
+            "Please ensure you have:\n"
+            "1. Created a .env file in the project root\n"
+            "2. Added your Discord bot token: DISCORD_TOKEN=your_token_here\n"
+            "For help setting up your bot, see the README.md file.", e
+        )
     except Exception as e:
-        print(f"\n❌ Error starting bot: {e}\n")
+        logger.exception("❌ Error starting bot: %s", e)
 
 
 if __name__ == "__main__":
     main()
-
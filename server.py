@@ -1,8 +1,11 @@
 """Simple HTTP server for Render web service health checks."""
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import threading
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 class HealthCheckHandler(BaseHTTPRequestHandler):
     """Simple handler that responds to health checks."""
@@ -28,14 +31,16 @@ def start_server(port=10000):
     server = HTTPServer(('0.0.0.0', port), HealthCheckHandler)
     thread = threading.Thread(target=server.serve_forever, daemon=True)
     thread.start()
-    print(f'✓ HTTP server started on port {port} for health checks')
+    logger.info('✓ HTTP server started on port %d for health checks', port)
     return server
 
 
 if __name__ == '__main__':
+    from utils.log import setup_logging
+    setup_logging()
     port = int(os.environ.get('PORT', 10000))
     start_server(port)
-    print(f'Health check server running on http://0.0.0.0:{port}')
+    logger.info('Health check server running on http://0.0.0.0:%d', port)
     
     # Keep running
     import time
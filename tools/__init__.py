@@ -0,0 +1,4 @@
+# Tools package initialization
+
+
+
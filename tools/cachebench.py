@@ -0,0 +1,239 @@
+"""Gateway cache benchmark: compare the default and lean cache profiles offline.
+
+Builds ``MusicBot`` once per profile, each in a fresh interpreter, and feeds
+synthetic gateway payloads through discord.py's own event parsers: a start-up
+burst of GUILD_CREATE events, then a stream of guild traffic (messages,
+typing, reactions) filtered by the profile's intents the way Discord filters
+what it sends. Reports start-up processing time, RSS and cache sizes for
+each profile. No Discord connection is needed.
+
+Usage:
+    python -m tools.cachebench --guilds 5000
+    python -m tools.cachebench --guilds 20000 --events-per-guild 100
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import discord
+
+from utils.memory import cache_counts, rss_mb
+
+PROFILES = ('default', 'lean')
+
+# Gateway events in the simulated traffic -> (intent that enables them, share of the traffic)
+TRAFFIC = {
+    'MESSAGE_CREATE': ('guild_messages', 0.5),
+    'TYPING_START': ('guild_typing', 0.35),
+    'MESSAGE_REACTION_ADD': ('guild_reactions', 0.15),
+}
+
+_TIMESTAMP = '2024-01-01T00:00:00+00:00'
+_BOT_ID = 100_000_000_000_000_000
+
+
+def user_payload(user_id: int) -> dict:
+    return {'id': str(user_id), 'username': f'user{user_id % 100000}', 'discriminator': '0',
+            'global_name': None, 'avatar': None, 'bot': False}
+
+
+def member_payload(user_id: int) -> dict:
+    return {'user': user_payload(user_id), 'roles': [], 'joined_at': _TIMESTAMP,
+            'deaf': False, 'mute': False, 'flags': 0}
+
+
+class SyntheticGuild:
+    """IDs and payloads for one simulated guild."""
+    
+    def __init__(self, index: int, args):
+        self.id = _BOT_ID + (index + 1) * 1_000_000
+        self.text_channels = [self.id + 1 + i for i in range(args.text_channels)]
+        self.voice_channels = [self.id + 1000 + i for i in range(args.voice_channels)]
+        self.users = [self.id + 100_000 + i for i in range(args.active_users)]
+        self.in_voice = self.users[:args.voice_members]
+        self.messages = []
+        self.next_message = self.id + 500_000
+    
+    def create_payload(self, args) -> dict:
+        channels = [
+            {'id': str(channel_id), 'type': 0, 'name': f'text-{i}', 'position': i,
+             'permission_overwrites': [], 'parent_id': None, 'nsfw': False, 'topic': None,
+             'last_message_id': None, 'rate_limit_per_user': 0}
+            for i, channel_id in enumerate(self.text_channels)
+        ] + [
+            {'id': str(channel_id), 'type': 2, 'name': f'voice-{i}', 'position': i,
+             'permission_overwrites': [], 'parent_id': None, 'bitrate': 64000, 'user_limit': 0,
+             'rtc_region': None}
+            for i, channel_id in enumerate(self.voice_channels)
+        ]
+        roles = [
+            {'id': str(self.id + (200_000 + i if i else 0)), 'name': f'role-{i}' if i else '@everyone',
+             'permissions': '104324673', 'position': i, 'color': 0, 'hoist': False,
+             'managed': False, 'mentionable': False, 'flags': 0}
+            for i in range(args.roles)
+        ]
+        emojis = [
+            {'id': str(self.id + 300_000 + i), 'name': f'emoji{i}', 'roles': [], 'require_colons': True,
+             'managed': False, 'animated': False, 'available': True}
+            for i in range(args.emojis)
+        ]
+        # Without the members intent Discord only sends the bot and members in voice
+        members = [member_payload(_BOT_ID)] + [member_payload(user_id) for user_id in self.in_voice]
+        voice_states = [
+            {'user_id': str(user_id), 'channel_id': str(self.voice_channels[0]), 'session_id': 'x',
+             'deaf': False, 'mute': False, 'self_deaf': False, 'self_mute': False,
+             'self_video': False, 'suppress': False, 'request_to_speak_timestamp': None}
+            for user_id in self.in_voice
+        ]
+        return {
+            'id': str(self.id), 'name': f'guild-{self.id}', 'icon': None, 'owner_id': str(self.users[0]),
+            'member_count': args.member_count, 'large': args.member_count > 250, 'features': [],
+            'channels': channels, 'roles': roles, 'emojis': emojis, 'stickers': [],
+            'members': members, 'voice_states': voice_states, 'presences': [], 'threads': [],
+            'stage_instances': [], 'guild_scheduled_events': [], 'unavailable': False,
+            'verification_level': 0, 'explicit_content_filter': 0, 'default_message_notifications': 0,
+            'mfa_level': 0, 'premium_tier': 0, 'preferred_locale': 'en-US', 'system_channel_flags': 0,
+            'nsfw_level': 0, 'afk_timeout': 300, 'joined_at': _TIMESTAMP,
+        }
+    
+    def event_payload(self, name: str) -> dict:
+        user_id = random.choice(self.users)
+        channel_id = str(random.choice(self.text_channels))
+        if name == 'MESSAGE_CREATE':
+            message_id = self.next_message
+            self.next_message += 1
+            self.messages.append(message_id)
+            return {
+                'id': str(message_id), 'channel_id': channel_id, 'guild_id': str(self.id),
+                'author': user_payload(user_id), 'member': {k: v for k, v in member_payload(user_id).items()
+                                                            if k != 'user'},
+                'content': 'x' * random.randint(10, 200), 'timestamp': _TIMESTAMP, 'edited_timestamp': None,
+                'tts': False, 'mention_everyone': False, 'mentions': [], 'mention_roles': [],
+                'attachments': [], 'embeds': [], 'pinned': False, 'type': 0,
+            }
+        if name == 'TYPING_START':
+            return {'channel_id': channel_id, 'guild_id': str(self.id), 'user_id': str(user_id),
+                    'timestamp': int(time.time()), 'member': member_payload(user_id)}
+        message_id = random.choice(self.messages) if self.messages else self.next_message
+        return {'user_id': str(user_id), 'channel_id': channel_id, 'message_id': str(message_id),
+                'guild_id': str(self.id), 'member': member_payload(user_id), 'burst': False, 'type': 0,
+                'emoji': {'id': None, 'name': '👍'}}
+
+
+async def run_profile(args) -> dict:
+    """Measure the active profile (LEAN_CACHE is read from the environment at import)."""
+    from bot import MusicBot
+    
+    random.seed(args.seed)
+    baseline = rss_mb()
+    bot = MusicBot()
+    await bot._async_setup_hook()
+    state = bot._connection
+    state.user = discord.ClientUser(state=state, data={**user_payload(_BOT_ID), 'bot': True})
+    guilds = [SyntheticGuild(index, args) for index in range(args.guilds)]
+    
+    # Payloads arrive as JSON text, so decoding is part of the cost
+    burst = [json.dumps(guild.create_payload(args)) for guild in guilds]
+    started = time.perf_counter()
+    for raw in burst:
+        state.parsers['GUILD_CREATE'](json.loads(raw))
+    ready_seconds = time.perf_counter() - started
+    del burst
+    await asyncio.sleep(0)
+    gc.collect()
+    ready_rss = rss_mb()
+    
+    names = list(TRAFFIC)
+    weights = [share for _, share in TRAFFIC.values()]
+    delivered = 0
+    event_seconds = 0.0
+    for _ in range(args.guilds * args.events_per_guild):
+        guild = random.choice(guilds)
+        name = random.choices(names, weights)[0]
+        if not getattr(bot.intents, TRAFFIC[name][0]):
+            continue  # Discord doesn't send events for intents the bot didn't ask for
+        raw = json.dumps(guild.event_payload(name))
+        started = time.perf_counter()
+        state.parsers[name](json.loads(raw))
+        event_seconds += time.perf_counter() - started
+        delivered += 1
+        if delivered % 500 == 0:
+            await asyncio.sleep(0)  # Let dispatched listeners run
+    await asyncio.sleep(0.1)
+    gc.collect()
+    
+    return {
+        'intents': bot.intents.value,
+        'ready_seconds': ready_seconds,
+        'baseline_rss_mb': baseline,
+        'ready_rss_mb': ready_rss,
+        'final_rss_mb': rss_mb(),
+        'events_delivered': delivered,
+        'event_seconds': event_seconds,
+        'cache': cache_counts(bot),
+    }
+
+
+def run_isolated(profile: str, argv) -> dict:
+    """Run one profile in a fresh interpreter so RSS isn't shared between profiles."""
+    env = {**os.environ, 'LEAN_CACHE': 'true' if profile == 'lean' else 'false'}
+    output = subprocess.run(
+        [sys.executable, '-m', 'tools.cachebench', '--profile', profile, *argv],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_comparison(results: dict):
+    rows = [
+        ('Intents value', lambda r: str(r['intents'])),
+        ('GUILD_CREATE burst', lambda r: f"{r['ready_seconds']:.2f} s"),
+        ('RSS after start-up', lambda r: f"{r['ready_rss_mb'] - r['baseline_rss_mb']:.1f} MB"),
+        ('Events delivered', lambda r: f"{r['events_delivered']:,}"),
+        ('Event processing', lambda r: f"{r['event_seconds']:.2f} s"),
+        ('RSS after traffic', lambda r: f"{r['final_rss_mb'] - r['baseline_rss_mb']:.1f} MB"),
+    ] + [
+        (f'Cached {kind}', lambda r, kind=kind: f"{r['cache'][kind]:,}")
+        for kind in results[PROFILES[0]]['cache']
+    ]
+    print(f"{'':<22}" + ''.join(f'{profile:>16}' for profile in results))
+    for label, value in rows:
+        print(f'{label:<22}' + ''.join(f'{value(result):>16}' for result in results.values()))
+    print('\nRSS is measured from just before the bot is built.')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Compare gateway cache profiles with synthetic traffic.')
+    parser.add_argument('--guilds', type=int, default=5000, help='number of synthetic guilds')
+    parser.add_argument('--member-count', type=int, default=500, help='reported member count per guild')
+    parser.add_argument('--active-users', type=int, default=50, help='users sending events per guild')
+    parser.add_argument('--voice-members', type=int, default=2, help='members in voice per guild')
+    parser.add_argument('--text-channels', type=int, default=10, help='text channels per guild')
+    parser.add_argument('--voice-channels', type=int, default=3, help='voice channels per guild')
+    parser.add_argument('--roles', type=int, default=15, help='roles per guild')
+    parser.add_argument('--emojis', type=int, default=20, help='custom emojis per guild')
+    parser.add_argument('--events-per-guild', type=int, default=50, help='simulated gateway events per guild')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the synthetic traffic')
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.profile:
+        # Child process: measure one profile and report it as JSON
+        print(json.dumps(asyncio.run(run_profile(args))))
+        return
+    results = {profile: run_isolated(profile, argv) for profile in PROFILES}
+    print_comparison(results)
+
+
+if __name__ == '__main__':
+    main()
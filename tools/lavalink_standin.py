@@ -0,0 +1,323 @@
+"""Local stand-in for a Lavalink (v4) audio node.
+
+Implements the subset of the Lavalink protocol the bot's ``LavalinkBackend``
+uses, without producing any audio: track loading over REST, player updates,
+and websocket ``ready`` / ``playerUpdate`` / ``stats`` / track events on a
+simulated clock. Useful for developing and load-testing the remote playback
+path without a JVM node or Discord voice.
+
+Usage:
+    python -m tools.lavalink_standin --port 2333 --password youshallnotpass
+    PLAYBACK_BACKEND=lavalink LAVALINK_URI=http://localhost:2333 python main.py
+
+``--fail-rate`` makes a fraction of tracks raise a ``TrackExceptionEvent``
+midway, to exercise the bot's stream recovery.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+import uuid
+import zlib
+from typing import Dict, Optional
+
+from aiohttp import web
+
+
+def encode_track(identifier: str, length_ms: int) -> str:
+    payload = json.dumps({'identifier': identifier, 'length': length_ms})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_track(encoded: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(encoded.encode()))
+
+
+class StandInPlayer:
+    """One guild's player on the stand-in node."""
+    
+    def __init__(self, node: 'StandInNode', session: 'Session', guild_id: str):
+        self.node = node
+        self.session = session
+        self.guild_id = guild_id
+        self.encoded: Optional[str] = None
+        self.length_ms = 0
+        self.volume = 100
+        self.paused = False
+        self.voice: dict = {}
+        self._position_ms = 0
+        self._resumed_at: Optional[float] = None
+        self._end_task: Optional[asyncio.Task] = None
+    
+    @property
+    def position_ms(self) -> int:
+        if self._resumed_at is None:
+            return self._position_ms
+        elapsed = (time.monotonic() - self._resumed_at) * 1000 / self.node.time_scale
+        return min(int(self._position_ms + elapsed), self.length_ms)
+    
+    def _freeze(self):
+        self._position_ms = self.position_ms
+        self._resumed_at = None
+    
+    def _run(self):
+        self._resumed_at = time.monotonic()
+        self._schedule_end()
+    
+    def _schedule_end(self):
+        if self._end_task:
+            self._end_task.cancel()
+            self._end_task = None
+        if self.encoded and not self.paused:
+            self._end_task = asyncio.create_task(self._play_out(self.encoded))
+    
+    async def _play_out(self, encoded: str):
+        remaining = max(self.length_ms - self._position_ms, 0) / 1000
+        fails = random.random() < self.node.fail_rate
+        await asyncio.sleep((remaining / 2 if fails else remaining) * self.node.time_scale)
+        if self.encoded != encoded:
+            return
+        track = self.track_json()
+        if fails:
+            await self.session.send_event(self.guild_id, 'TrackExceptionEvent', track, exception={
+                'message': 'Simulated stream failure', 'severity': 'fault', 'cause': 'stand-in node'
+            })
+            reason = 'loadFailed'
+        else:
+            reason = 'finished'
+        self._freeze()
+        self.encoded = None
+        await self.session.send_event(self.guild_id, 'TrackEndEvent', track, reason=reason)
+    
+    def track_json(self) -> Optional[dict]:
+        if not self.encoded:
+            return None
+        info = decode_track(self.encoded)
+        return {'encoded': self.encoded, 'info': {'identifier': info['identifier'], 'length': info['length']}}
+    
+    async def update(self, body: dict, no_replace: bool):
+        if 'voice' in body:
+            self.voice = body['voice']
+        if 'volume' in body:
+            self.volume = body['volume']
+        
+        track = body.get('track', {}) if 'track' in body else None
+        if track is not None and not (no_replace and self.encoded):
+            old = self.track_json()
+            new_encoded = track.get('encoded')
+            self._freeze()
+            self.encoded = new_encoded
+            if old:
+                await self.session.send_event(
+                    self.guild_id, 'TrackEndEvent', old, reason='replaced' if new_encoded else 'stopped'
+                )
+            if new_encoded:
+                self.length_ms = decode_track(new_encoded)['length']
+                self._position_ms = body.get('position', 0)
+                self.paused = body.get('paused', False)
+                if not self.paused:
+                    self._run()
+                await self.session.send_event(self.guild_id, 'TrackStartEvent', self.track_json())
+            elif self._end_task:
+                self._end_task.cancel()
+            return
+        
+        if 'position' in body and self.encoded:
+            self._freeze()
+            self._position_ms = body['position']
+            if not self.paused:
+                self._run()
+        if 'paused' in body and body['paused'] != self.paused:
+            self.paused = body['paused']
+            if self.paused:
+                self._freeze()
+                self._schedule_end()
+            else:
+                self._run()
+    
+    def to_json(self) -> dict:
+        return {
+            'guildId': self.guild_id,
+            'track': self.track_json(),
+            'volume': self.volume,
+            'paused': self.paused,
+            'state': {'time': int(time.time() * 1000), 'position': self.position_ms, 'connected': bool(self.voice)},
+            'voice': self.voice,
+            'filters': {},
+        }
+    
+    def destroy(self):
+        self.encoded = None
+        if self._end_task:
+            self._end_task.cancel()
+
+
+class Session:
+    """A connected bot client and its players."""
+    
+    def __init__(self, ws: web.WebSocketResponse):
+        self.session_id = uuid.uuid4().hex[:16]
+        self.ws = ws
+        self.players: Dict[str, StandInPlayer] = {}
+    
+    async def send(self, payload: dict):
+        if not self.ws.closed:
+            await self.ws.send_json(payload)
+    
+    async def send_event(self, guild_id: str, event_type: str, track: Optional[dict], **fields):
+        await self.send({'op': 'event', 'type': event_type, 'guildId': guild_id, 'track': track, **fields})
+
+
+class StandInNode:
+    """aiohttp application implementing the Lavalink v4 endpoints the bot uses."""
+    
+    def __init__(self, password: str, time_scale: float, fail_rate: float, track_length: int):
+        self.password = password
+        self.time_scale = time_scale
+        self.fail_rate = fail_rate
+        self.track_length = track_length
+        self.sessions: Dict[str, Session] = {}
+        self.started = time.monotonic()
+    
+    def authorized(self, request: web.Request) -> bool:
+        return request.headers.get('Authorization') == self.password
+    
+    @web.middleware
+    async def auth_middleware(self, request: web.Request, handler):
+        if not self.authorized(request):
+            return web.json_response({'status': 401, 'message': 'Unauthorized'}, status=401)
+        return await handler(request)
+    
+    async def websocket(self, request: web.Request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        session = Session(ws)
+        self.sessions[session.session_id] = session
+        await session.send({'op': 'ready', 'resumed': False, 'sessionId': session.session_id})
+        print(f"Client {request.headers.get('Client-Name', '?')} connected (session {session.session_id})")
+        
+        updates = asyncio.create_task(self._player_updates(session))
+        try:
+            async for _ in ws:
+                pass  # Clients don't send anything on the v4 websocket
+        finally:
+            updates.cancel()
+            for player in session.players.values():
+                player.destroy()
+            self.sessions.pop(session.session_id, None)
+            print(f"Session {session.session_id} closed")
+        return ws
+    
+    async def _player_updates(self, session: Session):
+        ticks = 0
+        while True:
+            await asyncio.sleep(1)
+            ticks += 1
+            for player in list(session.players.values()):
+                if player.encoded:
+                    await session.send({'op': 'playerUpdate', 'guildId': player.guild_id,
+                                        'state': player.to_json()['state']})
+            if ticks % 60 == 0:
+                await session.send({'op': 'stats', **self.stats()})
+    
+    def stats(self) -> dict:
+        players = [p for s in self.sessions.values() for p in s.players.values()]
+        return {
+            'players': len(players),
+            'playingPlayers': sum(1 for p in players if p.encoded and not p.paused),
+            'uptime': int((time.monotonic() - self.started) * 1000),
+            'memory': {'free': 0, 'used': 0, 'allocated': 0, 'reservable': 0},
+            'cpu': {'cores': 1, 'systemLoad': 0.0, 'lavalinkLoad': 0.0},
+            'frameStats': None,
+        }
+    
+    async def info(self, request: web.Request):
+        return web.json_response({
+            'version': {'semver': '4.0.0-standin', 'major': 4, 'minor': 0, 'patch': 0},
+            'sourceManagers': ['youtube', 'soundcloud', 'http'],
+            'filters': [],
+            'plugins': [],
+        })
+    
+    async def load_tracks(self, request: web.Request):
+        identifier = request.query.get('identifier', '')
+        if not identifier:
+            return web.json_response({'loadType': 'empty', 'data': {}})
+        # Stable per-identifier length so repeated loads agree
+        length_ms = self.track_length or (120 + zlib.crc32(identifier.encode()) % 480) * 1000
+        track = {
+            'encoded': encode_track(identifier, length_ms),
+            'info': {
+                'identifier': identifier, 'isSeekable': True, 'author': 'Stand-in',
+                'length': length_ms, 'isStream': False, 'position': 0,
+                'title': f'Stand-in track {identifier[-24:]}', 'uri': identifier, 'sourceName': 'http',
+            },
+            'pluginInfo': {},
+            'userData': {},
+        }
+        load_type = 'search' if identifier.startswith(('ytsearch:', 'scsearch:')) else 'track'
+        return web.json_response({'loadType': load_type, 'data': [track] if load_type == 'search' else track})
+    
+    def _session(self, request: web.Request) -> Session:
+        session = self.sessions.get(request.match_info['session_id'])
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({'status': 404, 'message': 'Session not found'}),
+                                   content_type='application/json')
+        return session
+    
+    async def update_player(self, request: web.Request):
+        session = self._session(request)
+        guild_id = request.match_info['guild_id']
+        player = session.players.get(guild_id) or StandInPlayer(self, session, guild_id)
+        session.players[guild_id] = player
+        await player.update(await request.json(), request.query.get('noReplace') == 'true')
+        return web.json_response(player.to_json())
+    
+    async def get_player(self, request: web.Request):
+        player = self._session(request).players.get(request.match_info['guild_id'])
+        if player is None:
+            raise web.HTTPNotFound()
+        return web.json_response(player.to_json())
+    
+    async def destroy_player(self, request: web.Request):
+        player = self._session(request).players.pop(request.match_info['guild_id'], None)
+        if player:
+            player.destroy()
+        return web.Response(status=204)
+    
+    async def get_stats(self, request: web.Request):
+        return web.json_response(self.stats())
+    
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.auth_middleware])
+        app.router.add_get('/v4/websocket', self.websocket)
+        app.router.add_get('/v4/info', self.info)
+        app.router.add_get('/v4/stats', self.get_stats)
+        app.router.add_get('/v4/loadtracks', self.load_tracks)
+        app.router.add_get('/v4/sessions/{session_id}/players/{guild_id}', self.get_player)
+        app.router.add_patch('/v4/sessions/{session_id}/players/{guild_id}', self.update_player)
+        app.router.add_delete('/v4/sessions/{session_id}/players/{guild_id}', self.destroy_player)
+        return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in Lavalink v4 node (no audio).')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2333)
+    parser.add_argument('--password', default='youshallnotpass')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='wall seconds per second of audio')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of tracks that fail midway')
+    parser.add_argument('--track-length', type=int, default=0, help='fixed track length in ms (0 = varied)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    node = StandInNode(args.password, args.time_scale, args.fail_rate, args.track_length)
+    web.run_app(node.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
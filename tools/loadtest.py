@@ -0,0 +1,463 @@
+"""Local multi-guild load and soak test harness for the music bot.
+
+Drives ``MusicBot`` and the ``Music`` cog with simulated guilds, members,
+voice clients and a stub extractor, so no Discord connection, network access
+or FFmpeg is needed. Each virtual guild issues a realistic mix of commands
+and the harness periodically reports command latency, event-loop lag, RSS
+growth and leaked players / FFmpeg processes.
+
+Usage:
+    python -m tools.loadtest --guilds 1000 --duration 3600
+    python -m tools.loadtest --guilds 10000 --duration 14400 --report-file soak.jsonl
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import zlib
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import discord
+
+from bot import MusicBot
+from utils.extractors import ExtractorRouter
+from utils.log import setup_logging
+from utils.memory import rss_mb
+from utils.music_player import FRAME_SECONDS
+
+
+# Relative weights of the commands each virtual guild issues
+COMMAND_MIX = {
+    'play': 40,
+    'playlist': 5,
+    'skip': 15,
+    'queue': 25,
+    'churn': 5,  # leave, then rejoin on the next play
+    'idle': 10,
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return the pct-th percentile of values (nearest-rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class StubExtractor:
+    """Stands in for ``yt_dlp.YoutubeDL`` with simulated latency and fake metadata."""
+    
+    def __init__(self, latency: float, playlist_size: int):
+        self.latency = latency
+        self.playlist_size = playlist_size
+        self.calls = 0
+    
+    def _entry(self, video_id: str) -> dict:
+        duration = 120 + zlib.crc32(video_id.encode()) % 480
+        return {
+            'id': video_id,
+            'title': f'Stub track {video_id}',
+            'url': f'stub://{video_id}?duration={duration}',
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+            'duration': duration,
+            'thumbnail': None,
+        }
+    
+    def extract_info(self, query: str, download: bool = False, **kwargs) -> dict:
+        # Runs in a worker thread like the real extractor, so blocking here is realistic
+        self.calls += 1
+        time.sleep(random.uniform(0.5, 1.5) * self.latency)
+        
+        if 'list=' in query:
+            playlist_id = query.rsplit('list=', 1)[1]
+            return {
+                'title': f'Stub playlist {playlist_id}',
+                'entries': [
+                    # Flat entries: no duration, so the player re-extracts each one
+                    {'id': video_id, 'title': f'Stub track {video_id}',
+                     'url': f'https://www.youtube.com/watch?v={video_id}'}
+                    for video_id in (f'{zlib.crc32(f"{playlist_id}-{i}".encode()):011d}'
+                                     for i in range(self.playlist_size))
+                ],
+            }
+        if 'watch?v=' in query:
+            return self._entry(query.rsplit('v=', 1)[1])
+        return self._entry(f"{zlib.crc32(query.encode()):011d}")
+
+
+class FakeFFmpegAudio(discord.AudioSource):
+    """Replaces ``discord.FFmpegPCMAudio``; counts instances standing in for FFmpeg processes."""
+    
+    live = set()
+    spawned = 0
+    
+    def __init__(self, source: str, **kwargs):
+        self.duration = int(parse_qs(urlparse(source).query).get('duration', ['180'])[0])
+        FakeFFmpegAudio.live.add(self)
+        FakeFFmpegAudio.spawned += 1
+    
+    def read(self) -> bytes:
+        return b'\x00' * discord.opus.Encoder.FRAME_SIZE
+    
+    def cleanup(self):
+        FakeFFmpegAudio.live.discard(self)
+
+
+class FakeMessage:
+    """Message returned by ``FakeContext.send``."""
+    
+    async def delete(self):
+        pass
+    
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeVoiceClient:
+    """Simulates a connected voice client, finishing tracks on a compressed clock."""
+    
+    def __init__(self, channel, time_scale: float):
+        self.channel = channel
+        self.guild = channel.guild
+        self.time_scale = time_scale
+        self.source: Optional[discord.AudioSource] = None
+        self._after = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._paused = False
+        self._connected = True
+    
+    def is_connected(self) -> bool:
+        return self._connected
+    
+    def is_playing(self) -> bool:
+        return self.source is not None and not self._paused
+    
+    def is_paused(self) -> bool:
+        return self.source is not None and self._paused
+    
+    def play(self, source, *, after=None):
+        if self.source is not None:
+            raise discord.ClientException('Already playing audio.')
+        self.source = source
+        self._after = after
+        
+        ffmpeg = getattr(source, 'original', source)
+        start_offset = getattr(source, 'start_offset', 0.0)
+        remaining = max(getattr(ffmpeg, 'duration', 180) - start_offset, 0)
+        self._timer = asyncio.get_running_loop().call_later(
+            remaining * self.time_scale, self._finish, remaining
+        )
+    
+    def _finish(self, played: float):
+        # Account for the frames a real voice client would have read
+        if hasattr(self.source, 'frames'):
+            self.source.frames += int(played / FRAME_SECONDS)
+        self._end(None)
+    
+    def _end(self, error):
+        source, after = self.source, self._after
+        self.source = None
+        self._after = None
+        self._paused = False
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if source is not None:
+            source.cleanup()
+        if after is not None:
+            after(error)
+    
+    def stop(self):
+        self._end(None)
+    
+    def pause(self):
+        self._paused = True
+    
+    def resume(self):
+        self._paused = False
+    
+    async def move_to(self, channel):
+        self.channel = channel
+    
+    async def disconnect(self, *, force: bool = False):
+        self.stop()
+        self._connected = False
+        self.guild.voice_client = None
+
+
+class FakeVoiceChannel:
+    """Voice channel that connects ``FakeVoiceClient`` instances."""
+    
+    def __init__(self, guild, time_scale: float):
+        self.guild = guild
+        self.time_scale = time_scale
+        self.members = []
+    
+    async def connect(self, **kwargs):
+        self.guild.voice_client = FakeVoiceClient(self, self.time_scale)
+        return self.guild.voice_client
+
+
+class FakeGuild:
+    """Virtual guild with one voice channel and a pool of members."""
+    
+    def __init__(self, guild_id: int, members: int, time_scale: float):
+        self.id = guild_id
+        self.name = f'Guild {guild_id}'
+        self.voice_client: Optional[FakeVoiceClient] = None
+        self.voice_channel = FakeVoiceChannel(self, time_scale)
+        self.members = [FakeMember(guild_id * 1000 + i, self) for i in range(members)]
+        self.voice_channel.members = list(self.members)
+
+
+class FakeVoiceState:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class FakeMember:
+    """Member sitting in the guild's voice channel."""
+    
+    def __init__(self, member_id: int, guild: FakeGuild):
+        self.id = member_id
+        self.guild = guild
+        self.name = f'user{member_id}'
+        self.display_name = self.name
+        self.mention = f'<@{member_id}>'
+    
+    @property
+    def voice(self):
+        return FakeVoiceState(self.guild.voice_channel)
+
+
+class FakeContext:
+    """Just enough of ``commands.Context`` for the music cog."""
+    
+    def __init__(self, bot, guild: FakeGuild, author: FakeMember):
+        self.bot = bot
+        self.guild = guild
+        self.author = author
+        self.channel = None
+        self.prefix = '!'
+        self.clean_prefix = '!'
+        self.sent = 0
+    
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+    
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        return FakeMessage()
+
+
+class LoadTest:
+    """Runs virtual guilds against the music cog and collects metrics."""
+    
+    def __init__(self, args):
+        self.args = args
+        self.latencies: Dict[str, List[float]] = {name: [] for name in COMMAND_MIX}
+        self.loop_lag: List[float] = []
+        self.errors = 0
+        self.commands_run = 0
+        self.extractor = StubExtractor(args.extract_latency, args.playlist_size)
+        self.stopping = False
+        self.baseline_rss = 0.0
+        self.started = 0.0
+    
+    async def setup(self):
+        """Build the bot offline and load the music cog."""
+        # Patch FFmpeg out before the cog touches it
+        discord.FFmpegPCMAudio = FakeFFmpegAudio
+        
+        self.bot = MusicBot()
+        await self.bot._async_setup_hook()
+        await self.bot.load_extension('cogs.music')
+        self.cog = self.bot.get_cog('Music')
+        
+        # Every extractor route uses the stub instead of yt-dlp
+        self.bot.extractors = ExtractorRouter(factory=lambda options: self.extractor)
+        # Loudness analysis would spawn real FFmpeg processes on stub URLs
+        self.bot.loudness = None
+        
+        self.guilds = [
+            FakeGuild(guild_id, self.args.members, self.args.time_scale)
+            for guild_id in range(1, self.args.guilds + 1)
+        ]
+    
+    async def run_command(self, name: str, guild: FakeGuild):
+        """Issue one command for a guild and record its latency."""
+        ctx = FakeContext(self.bot, guild, random.choice(guild.members))
+        start = time.perf_counter()
+        try:
+            if name == 'play':
+                video_id = f'{random.randrange(self.args.catalog):011d}'  # 11 characters, like real IDs
+                await self.cog.play.callback(self.cog, ctx, query=f'https://www.youtube.com/watch?v={video_id}')
+            elif name == 'playlist':
+                playlist_id = random.randrange(self.args.catalog // 10 + 1)
+                await self.cog.play.callback(self.cog, ctx, query=f'https://www.youtube.com/playlist?list=PL{playlist_id}')
+            elif name == 'skip':
+                if guild.voice_client:
+                    await self.cog.skip.callback(self.cog, ctx)
+            elif name == 'queue':
+                await self.cog.queue.callback(self.cog, ctx)
+            elif name == 'churn':
+                if guild.voice_client:
+                    await self.cog.leave.callback(self.cog, ctx)
+            else:
+                return
+        except Exception as e:
+            self.errors += 1
+            if self.args.verbose:
+                print(f'[guild {guild.id}] {name} failed: {e!r}')
+            return
+        self.latencies[name].append(time.perf_counter() - start)
+        self.commands_run += 1
+    
+    async def guild_worker(self, guild: FakeGuild):
+        """Issue commands for one guild until the test ends."""
+        names = list(COMMAND_MIX)
+        weights = list(COMMAND_MIX.values())
+        # Stagger start-up so guilds don't all fire at once
+        await asyncio.sleep(random.uniform(0, self.args.think_time))
+        while not self.stopping:
+            await self.run_command(random.choices(names, weights)[0], guild)
+            await asyncio.sleep(random.expovariate(1 / self.args.think_time))
+    
+    async def monitor_loop_lag(self):
+        """Measure how late the event loop wakes up a sleeping task."""
+        interval = 0.1
+        while not self.stopping:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - start - interval))
+    
+    def snapshot(self) -> dict:
+        """Collect the metrics for the interval since the last snapshot."""
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        connected = {guild.id for guild in self.guilds if guild.voice_client}
+        playing = sum(1 for guild in self.guilds if guild.voice_client and guild.voice_client.source)
+        players = self.bot.music_players
+        rss = rss_mb()
+        
+        report = {
+            'elapsed_s': round(time.perf_counter() - self.started, 1),
+            'commands': len(all_latencies),
+            'errors': self.errors,
+            'p50_ms': round(percentile(all_latencies, 50) * 1000, 1),
+            'p99_ms': round(percentile(all_latencies, 99) * 1000, 1),
+            'per_command_p99_ms': {
+                name: round(percentile(values, 99) * 1000, 1)
+                for name, values in self.latencies.items() if values
+            },
+            'loop_lag_p50_ms': round(percentile(self.loop_lag, 50) * 1000, 1),
+            'loop_lag_max_ms': round(max(self.loop_lag, default=0.0) * 1000, 1),
+            'rss_mb': round(rss, 1),
+            'rss_growth_mb': round(rss - self.baseline_rss, 1),
+            'connected_guilds': len(connected),
+            'players': len(players),
+            'leaked_players': sum(1 for guild_id in players if guild_id not in connected),
+            'queued_tracks': sum(len(player.queue) for player in players.values()),
+            'ffmpeg_live': len(FakeFFmpegAudio.live),
+            'leaked_ffmpeg': max(0, len(FakeFFmpegAudio.live) - playing),
+            'ffmpeg_spawned': FakeFFmpegAudio.spawned,
+            'extractor_calls': self.extractor.calls,
+            'tasks': len(asyncio.all_tasks()),
+        }
+        
+        for values in self.latencies.values():
+            values.clear()
+        self.loop_lag.clear()
+        self.errors = 0
+        return report
+    
+    def print_report(self, report: dict):
+        print(
+            f"[{report['elapsed_s']:>8.1f}s] cmds={report['commands']:<6} err={report['errors']:<4} "
+            f"p50={report['p50_ms']:>7.1f}ms p99={report['p99_ms']:>8.1f}ms "
+            f"lag={report['loop_lag_p50_ms']:>6.1f}/{report['loop_lag_max_ms']:>7.1f}ms "
+            f"rss={report['rss_mb']:>7.1f}MB (+{report['rss_growth_mb']:.1f}) "
+            f"voice={report['connected_guilds']:<5} players={report['players']:<5} "
+            f"leaked_players={report['leaked_players']:<4} ffmpeg={report['ffmpeg_live']:<5} "
+            f"leaked_ffmpeg={report['leaked_ffmpeg']}"
+        )
+    
+    async def run(self):
+        await self.setup()
+        print(f'Load test: {self.args.guilds} guild(s) for {self.args.duration}s '
+              f'(think time {self.args.think_time}s, time scale {self.args.time_scale})')
+        
+        self.baseline_rss = rss_mb()
+        self.started = time.perf_counter()
+        report_file = open(self.args.report_file, 'a') if self.args.report_file else None
+        
+        tasks = [asyncio.create_task(self.guild_worker(guild)) for guild in self.guilds]
+        tasks.append(asyncio.create_task(self.monitor_loop_lag()))
+        
+        try:
+            deadline = self.started + self.args.duration
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(min(self.args.report_interval, max(0.0, deadline - time.perf_counter())))
+                report = self.snapshot()
+                self.print_report(report)
+                if report_file:
+                    report_file.write(json.dumps(report) + '\n')
+                    report_file.flush()
+        finally:
+            self.stopping = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if report_file:
+                report_file.close()
+        
+        # Tear down every guild; anything still alive afterwards is a leak
+        for guild in self.guilds:
+            if guild.voice_client:
+                ctx = FakeContext(self.bot, guild, guild.members[0])
+                await self.cog.leave.callback(self.cog, ctx)
+        await asyncio.sleep(0.1)
+        
+        print('\nAfter teardown:')
+        print(f'  players left:      {len(self.bot.music_players)}')
+        print(f'  FFmpeg sources:    {len(FakeFFmpegAudio.live)}')
+        print(f'  RSS growth:        {rss_mb() - self.baseline_rss:.1f} MB')
+        
+        print('\nExtractor routes:')
+        for route, stats in self.bot.extractors.stats_summary().items():
+            print(f"  {route:<24} n={stats['count']:<6} err={stats['errors']:<4} "
+                  f"p50={stats['p50'] * 1000:>8.1f}ms p95={stats['p95'] * 1000:>8.1f}ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Multi-guild load and soak test for the music bot.')
+    parser.add_argument('--guilds', type=int, default=1000, help='number of virtual guilds')
+    parser.add_argument('--members', type=int, default=5, help='members per guild voice channel')
+    parser.add_argument('--duration', type=float, default=300, help='test length in seconds')
+    parser.add_argument('--think-time', type=float, default=10.0, help='mean seconds between commands per guild')
+    parser.add_argument('--time-scale', type=float, default=0.05, help='wall seconds per second of simulated audio')
+    parser.add_argument('--extract-latency', type=float, default=0.2, help='mean stub extraction time in seconds')
+    parser.add_argument('--playlist-size', type=int, default=25, help='tracks per stub playlist')
+    parser.add_argument('--catalog', type=int, default=5000, help='number of distinct stub tracks')
+    parser.add_argument('--report-interval', type=float, default=30.0, help='seconds between reports')
+    parser.add_argument('--report-file', help='append each report as a JSON line to this file')
+    parser.add_argument('--seed', type=int, help='random seed for a reproducible command mix')
+    parser.add_argument('--verbose', action='store_true', help='print every failed command')
+    parser.add_argument('--log-level', default='WARNING', help='log level for the bot itself')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_level)
+    if args.seed is not None:
+        random.seed(args.seed)
+    asyncio.run(LoadTest(args).run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,448 @@
+"""Multi-process audio engine for PCM-path playback.
+
+Reading FFmpeg output, applying volume and Opus-encoding every 20 ms frame is
+Python-side work that competes for the GIL with gateway handling when done in
+the bot process. With ``AUDIO_WORKERS`` set, ``AudioWorkerPool`` moves that
+work into a pool of worker processes: each voice session is assigned to the
+least-loaded worker, which runs FFmpeg, scales and encodes the audio, and
+streams Opus frames back over a pipe to a ``WorkerAudioSource`` that the voice
+client consumes as a pre-encoded source.
+
+Flow control is credit based: a worker keeps at most ``AUDIO_WORKER_BUFFER``
+unacknowledged frames in flight per session, and the source acknowledges frames
+as the voice client reads them, so pausing a track also pauses its worker.
+"""
+import json
+import logging
+import multiprocessing
+import queue
+import shlex
+import struct
+import subprocess
+import threading
+import time
+import uuid
+from array import array
+from typing import Dict, List, Optional
+
+import discord
+
+from utils.config import AUDIO_WORKER_BUFFER
+from utils.tracing import Span
+
+try:
+    import audioop
+except ImportError:  # Removed from the standard library in Python 3.13
+    audioop = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+
+# Worker -> parent messages: 1-byte type, 16-byte session ID, payload
+_FRAME = b'F'
+_END = b'E'
+_STATS = b'S'
+_HEADER = struct.Struct('!c16s')
+
+# Frames acknowledged to the worker at a time
+_ACK_EVERY = 10
+
+# Seconds before a dead worker is replaced, so one that dies on start-up doesn't spin
+_RESTART_DELAY = 1.0
+
+
+def scale_volume(pcm: bytes, volume: float) -> bytes:
+    """Scale 16-bit PCM by volume, clamped like ``PCMVolumeTransformer``."""
+    volume = min(max(volume, 0.0), 2.0)
+    if volume == 1.0:
+        return pcm
+    if audioop is not None:
+        return audioop.mul(pcm, 2, volume)
+    samples = array('h', pcm)
+    for i, sample in enumerate(samples):
+        samples[i] = max(-32768, min(32767, int(sample * volume)))
+    return samples.tobytes()
+
+
+class _WorkerSession(threading.Thread):
+    """Runs inside a worker process: FFmpeg -> volume -> Opus -> parent, for one session."""
+    
+    def __init__(self, session_id: bytes, source: str, before_options: str, options: str,
+                 volume: float, send):
+        super().__init__(name=f'session-{session_id.hex()[:8]}', daemon=True)
+        self.session_id = session_id
+        self.volume = volume
+        self.credits = threading.Semaphore(AUDIO_WORKER_BUFFER)
+        self.stopped = threading.Event()
+        self.frames = 0
+        self.encode_time = 0.0
+        self._send = send
+        
+        args = ['ffmpeg']
+        args.extend(shlex.split(before_options or ''))
+        args.extend(('-i', source, '-f', 's16le', '-ar', '48000', '-ac', '2', '-loglevel', 'warning'))
+        args.extend(shlex.split(options or ''))
+        args.append('pipe:1')
+        self.args = args
+        self.process: Optional[subprocess.Popen] = None
+    
+    def run(self):
+        error = ''
+        try:
+            encoder = discord.opus.Encoder()
+            self.process = subprocess.Popen(self.args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+            while not self.stopped.is_set():
+                pcm = self.process.stdout.read(FRAME_SIZE)
+                if len(pcm) != FRAME_SIZE:
+                    returncode = self.process.poll()
+                    if returncode not in (None, 0):
+                        error = f'FFmpeg exited with code {returncode}'
+                    break
+                
+                started = time.perf_counter()
+                packet = encoder.encode(scale_volume(pcm, self.volume), encoder.SAMPLES_PER_FRAME)
+                self.encode_time += time.perf_counter() - started
+                self.frames += 1
+                
+                # Wait until the parent has room for another frame
+                while not self.credits.acquire(timeout=0.5):
+                    if self.stopped.is_set():
+                        return
+                if self.stopped.is_set():
+                    return
+                self._send(_FRAME, self.session_id, packet)
+        except Exception as e:
+            error = repr(e)
+        finally:
+            self.kill()
+            if not self.stopped.is_set():
+                self._send(_END, self.session_id, error.encode())
+    
+    def kill(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+    
+    def stop(self):
+        self.stopped.set()
+        self.credits.release()
+        self.kill()
+
+
+def _worker_main(worker_id: int, control, data):
+    """Entry point of a worker process."""
+    if not discord.opus.is_loaded():
+        discord.opus._load_default()
+    
+    send_lock = threading.Lock()
+    sessions: Dict[bytes, _WorkerSession] = {}
+    finished = {'frames': 0, 'encode_seconds': 0.0}  # Totals of sessions already gone
+    started = time.monotonic()
+    
+    def send(kind: bytes, session_id: bytes, payload: bytes):
+        with send_lock:
+            data.send_bytes(_HEADER.pack(kind, session_id) + payload)
+    
+    def forget(session: _WorkerSession):
+        finished['frames'] += session.frames
+        finished['encode_seconds'] += session.encode_time
+    
+    def report_stats():
+        for session_id in [sid for sid, session in sessions.items() if not session.is_alive()]:
+            forget(sessions.pop(session_id))
+        stats = {
+            'sessions': len(sessions),
+            'frames': finished['frames'] + sum(session.frames for session in sessions.values()),
+            'encode_seconds': finished['encode_seconds'] + sum(
+                session.encode_time for session in sessions.values()
+            ),
+            'cpu_seconds': time.process_time(),
+            'uptime': time.monotonic() - started,
+        }
+        send(_STATS, b'\0' * 16, json.dumps(stats).encode())
+    
+    last_report = 0.0
+    while True:
+        if time.monotonic() - last_report >= 1.0:
+            report_stats()
+            last_report = time.monotonic()
+        if not control.poll(1.0):
+            continue
+        try:
+            message = control.recv()
+        except EOFError:
+            break
+        
+        command, session_id = message[0], message[1]
+        if command == 'start':
+            source, before_options, options, volume = message[2:]
+            session = _WorkerSession(session_id, source, before_options, options, volume, send)
+            sessions[session_id] = session
+            session.start()
+        elif command == 'ack':
+            session = sessions.get(session_id)
+            if session:
+                for _ in range(message[2]):
+                    session.credits.release()
+        elif command == 'volume':
+            session = sessions.get(session_id)
+            if session:
+                session.volume = message[2]
+        elif command == 'stop':
+            session = sessions.pop(session_id, None)
+            if session:
+                session.stop()
+                forget(session)
+        elif command == 'shutdown':
+            break
+    
+    for session in sessions.values():
+        session.stop()
+
+
+class WorkerAudioSource(discord.AudioSource):
+    """Pre-encoded source fed by a worker process; tracks position like ``TrackedAudio``."""
+    
+    def __init__(self, worker: 'AudioWorker', volume: float, start_offset: float = 0.0,
+                 first_packet_span: Optional[Span] = None):
+        self.session_id = uuid.uuid4().bytes
+        self.worker = worker
+        self.start_offset = start_offset
+        self.frames = 0
+        self.first_packet_span = first_packet_span
+        self.error: Optional[str] = None
+        self._volume = volume
+        self._buffer: queue.Queue = queue.Queue()
+        self._unacked = 0
+        self._ended = False
+    
+    def is_opus(self) -> bool:
+        return True
+    
+    @property
+    def volume(self) -> float:
+        return self._volume
+    
+    @volume.setter
+    def volume(self, value: float):
+        self._volume = max(value, 0.0)
+        self.worker.send('volume', self.session_id, self._volume)
+    
+    @property
+    def position(self) -> float:
+        """Seconds into the track of the last delivered frame."""
+        return self.start_offset + self.frames * FRAME_SECONDS
+    
+    def read(self) -> bytes:
+        if self._ended:
+            return b''
+        try:
+            packet = self._buffer.get(timeout=5)
+        except queue.Empty:
+            packet = None  # Worker stalled; end the stream so the player can recover
+            self.error = 'audio worker stalled'
+        
+        if not packet:
+            self._ended = True
+            return b''
+        
+        self.frames += 1
+        if self.frames == 1 and self.first_packet_span:
+            self.first_packet_span.finish()
+        
+        self._unacked += 1
+        if self._unacked >= _ACK_EVERY:
+            self.worker.send('ack', self.session_id, self._unacked)
+            self._unacked = 0
+        return packet
+    
+    def _feed(self, packet: bytes):
+        self._buffer.put(packet)
+    
+    def _end(self, error: str = ''):
+        if error:
+            self.error = error
+        self._buffer.put(None)
+    
+    def cleanup(self) -> None:
+        if self.first_packet_span and not self.first_packet_span.finished:
+            self.first_packet_span.finish(error='stream ended before the first packet')
+        self.worker.close_session(self)
+
+
+class AudioWorker:
+    """Parent-side handle for one worker process."""
+    
+    def __init__(self, worker_id: int, context, on_exit=None):
+        self.worker_id = worker_id
+        self.on_exit = on_exit  # Called from the reader thread if the worker dies
+        self.sessions: Dict[bytes, WorkerAudioSource] = {}
+        self.stats: dict = {}
+        self.frames_received = 0
+        self._context = context
+        self._send_lock = threading.Lock()
+        self.process = None
+        self._closing = False
+        self._control = None
+        self._reader: Optional[threading.Thread] = None
+    
+    def start(self):
+        control_parent, control_child = self._context.Pipe(duplex=False)
+        data_parent, data_child = self._context.Pipe(duplex=False)
+        self.process = self._context.Process(
+            target=_worker_main,
+            args=(self.worker_id, control_parent, data_child),
+            name=f'audio-worker-{self.worker_id}',
+            daemon=True
+        )
+        self.process.start()
+        control_parent.close()
+        data_child.close()
+        self._control = control_child
+        self._reader = threading.Thread(
+            target=self._read_loop, args=(data_parent,),
+            name=f'audio-worker-{self.worker_id}-reader', daemon=True
+        )
+        self._reader.start()
+        logger.info("Started audio worker %d (pid %s)", self.worker_id, self.process.pid)
+    
+    @property
+    def load(self) -> int:
+        return len(self.sessions)
+    
+    def send(self, *message):
+        try:
+            with self._send_lock:
+                self._control.send(message)
+        except (OSError, EOFError, ValueError) as e:
+            logger.warning("Audio worker %d unreachable: %s", self.worker_id, e)
+    
+    def open_session(self, source: WorkerAudioSource, url: str, before_options: str, options: str):
+        self.sessions[source.session_id] = source
+        self.send('start', source.session_id, url, before_options, options, source.volume)
+    
+    def close_session(self, source: WorkerAudioSource):
+        if self.sessions.pop(source.session_id, None) is not None:
+            self.send('stop', source.session_id)
+    
+    def _read_loop(self, data):
+        """Dispatch frames from the worker to their sources."""
+        while True:
+            try:
+                message = data.recv_bytes()
+            except (EOFError, OSError):
+                break
+            kind, session_id = _HEADER.unpack_from(message)
+            payload = message[_HEADER.size:]
+            
+            if kind == _FRAME:
+                source = self.sessions.get(session_id)
+                if source:
+                    self.frames_received += 1
+                    source._feed(payload)
+            elif kind == _END:
+                source = self.sessions.pop(session_id, None)
+                if source:
+                    source._end(payload.decode())
+            elif kind == _STATS:
+                self.stats = json.loads(payload)
+        
+        if self._closing:
+            return
+        # The worker died: end its sessions so their players can resume elsewhere
+        logger.error("Audio worker %d exited with %d live session(s)", self.worker_id, len(self.sessions))
+        for source in list(self.sessions.values()):
+            source._end('audio worker exited')
+        self.sessions.clear()
+        if self.on_exit:
+            self.on_exit(self)
+    
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+    
+    def shutdown(self):
+        self._closing = True
+        self.send('shutdown', b'\0' * 16)
+        if self.process:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+
+
+class AudioWorkerPool:
+    """Balances voice sessions across audio worker processes."""
+    
+    def __init__(self, size: int):
+        self.size = size
+        # Spawn, not fork: forking a process with a running event loop and gateway threads is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self.workers: List[AudioWorker] = []
+        self._lock = threading.Lock()
+        self._closing = False
+    
+    def _new_worker(self, worker_id: int) -> AudioWorker:
+        return AudioWorker(worker_id, self._context, on_exit=self._replace)
+    
+    def start(self):
+        self.workers = [self._new_worker(worker_id) for worker_id in range(self.size)]
+        for worker in self.workers:
+            worker.start()
+    
+    def _replace(self, worker: AudioWorker):
+        """Start a replacement for a dead worker.
+        
+        Runs on the dead worker's reader thread, so spawning the new process
+        never blocks the event loop.
+        """
+        worker.process.join(timeout=5)
+        time.sleep(_RESTART_DELAY)
+        with self._lock:
+            if self._closing or worker not in self.workers:
+                return
+            logger.warning("Restarting dead audio worker %d", worker.worker_id)
+            replacement = self._new_worker(worker.worker_id)
+            replacement.start()
+            self.workers[self.workers.index(worker)] = replacement
+    
+    def _pick_worker(self) -> AudioWorker:
+        # Dead workers are replaced in the background; until then they get no sessions
+        alive = [worker for worker in self.workers if worker.is_alive()]
+        if not alive:
+            raise RuntimeError("No audio worker is running")
+        return min(alive, key=lambda worker: worker.load)
+    
+    def open_source(self, url: str, before_options: str, options: str, volume: float = 0.5,
+                    start_offset: float = 0.0, first_packet_span: Optional[Span] = None) -> WorkerAudioSource:
+        """Start FFmpeg for url on the least-loaded worker and return its Opus source."""
+        worker = self._pick_worker()
+        source = WorkerAudioSource(worker, volume, start_offset, first_packet_span)
+        worker.open_session(source, url, before_options, options)
+        return source
+    
+    def stats(self) -> List[dict]:
+        """Per-worker load metrics."""
+        return [
+            {
+                'worker': worker.worker_id,
+                'pid': worker.process.pid if worker.process else None,
+                'alive': worker.is_alive(),
+                'sessions': worker.load,
+                'frames_received': worker.frames_received,
+                'frames_encoded': worker.stats.get('frames', 0),
+                'encode_seconds': worker.stats.get('encode_seconds', 0.0),
+                'cpu_seconds': worker.stats.get('cpu_seconds', 0.0),
+            }
+            for worker in self.workers
+        ]
+    
+    def shutdown(self):
+        with self._lock:
+            self._closing = True
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.shutdown()
@@ -35,5 +35,6 @@ def is_in_same_voice_channel():
     return commands.check(predicate)
 
 
-
-
+async def can_manage_settings(ctx) -> bool:
+    """Whether the author may change this server's settings (Manage Server or bot owner)."""
+    return ctx.author.guild_permissions.manage_guild or await ctx.bot.is_owner(ctx.author)
@@ -40,10 +40,66 @@ FFMPEG_OPTIONS = {
     'options': '-vn -b:a 128k',
 }
 
+# Stream recovery: how many times a dropped stream is re-resolved and resumed
+# at its last position before giving up on the track
+STREAM_MAX_RETRIES = 3
+# Tracks ending more than this many seconds before their duration count as dropped
+STREAM_RESUME_TOLERANCE = 5
+
+# Playback backend (see utils/playback.py): 'ffmpeg' plays in-process, 'lavalink' uses a remote audio node
+PLAYBACK_BACKEND = os.getenv('PLAYBACK_BACKEND', 'ffmpeg').lower()
+LAVALINK_URI = os.getenv('LAVALINK_URI', 'http://localhost:2333')
+LAVALINK_PASSWORD = os.getenv('LAVALINK_PASSWORD', 'youshallnotpass')
+
+# Audio worker processes for PCM playback (see utils/audio_workers.py); 0 keeps audio in-process
+AUDIO_WORKERS = int(os.getenv('AUDIO_WORKERS', '0'))
+AUDIO_WORKER_BUFFER = 50  # Encoded frames (20 ms each) a worker may send ahead of playback
+
+# Logging (see utils/log.py)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.getenv('LOG_LEVELS', 'discord=WARNING')  # Per-module levels: "module=LEVEL,..."
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json'
+LOG_QUEUE_SIZE = 10000  # Records buffered for the writer thread before new ones are dropped
+LOG_REPEAT_LIMIT = 20  # Records of the same message allowed per window (0 disables rate limiting)
+LOG_REPEAT_WINDOW = 10.0  # Seconds
+
+# Tracing of command pipelines (see utils/tracing.py)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))  # Fraction of commands traced
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH')  # JSON lines file for completed traces
+TRACE_COLLECTOR_URL = os.getenv('TRACE_COLLECTOR_URL')  # HTTP endpoint that accepts JSON lines
+
+# Per-guild settings (see utils/settings.py); these are the defaults for guilds without overrides
+SETTINGS_DB_PATH = os.getenv('SETTINGS_DB_PATH', 'settings.db')
+SETTINGS_FLUSH_INTERVAL = 5.0  # Seconds changes are batched before being written
+DEFAULT_VOLUME = 50  # Percent
+DEFAULT_IDLE_TIMEOUT = 180  # Seconds alone in a voice channel before disconnecting
+DEFAULT_MAX_QUEUE = 0  # 0 = unlimited
+
+# Loudness normalization (see utils/loudness.py); the default for the per-guild 'normalize' setting.
+# Off by default: measuring a track fetches its stream a second time.
+LOUDNESS_NORMALIZATION = os.getenv('LOUDNESS_NORMALIZATION', 'false').lower() in ('1', 'true', 'yes', 'on')
+LOUDNESS_TARGET = -16.0  # Integrated loudness (LUFS) tracks are brought to
+LOUDNESS_MAX_GAIN = 12.0  # dB, in either direction
+LOUDNESS_CACHE_SIZE = 5000  # Tracks whose gain is remembered
+LOUDNESS_ANALYSIS_WORKERS = 2  # Concurrent background FFmpeg measurements
+LOUDNESS_MAX_PENDING = 8  # Measurements running or waiting; more are skipped until the track plays again
+LOUDNESS_ANALYSIS_SECONDS = 900  # Audio measured per track at most
+
+# Lean gateway cache profile for bots in many guilds (see get_bot_intents / get_cache_options)
+LEAN_CACHE = os.getenv('LEAN_CACHE', 'false').lower() in ('1', 'true', 'yes', 'on')
+
 # Bot intents configuration
 def get_bot_intents():
     """Get the required Discord bot intents."""
     import discord
+    if LEAN_CACHE:
+        # Only the events the bot acts on: guild commands and voice state
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.guild_messages = True
+        intents.message_content = True
+        intents.voice_states = True
+        return intents
     intents = discord.Intents.default()
     intents.message_content = True
     intents.voice_states = True
@@ -51,3 +107,19 @@ def get_bot_intents():
     return intents
 
 
+def get_cache_options():
+    """Client cache options for the active cache profile."""
+    import discord
+    if not LEAN_CACHE:
+        return {}
+    # Keep members only while they are in voice (needed for channel.members);
+    # anyone else is resolved on demand by the command converters
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    return {
+        'member_cache_flags': member_cache_flags,
+        'max_messages': None,  # The bot never looks at old messages
+        'chunk_guilds_at_startup': False,
+    }
+
+
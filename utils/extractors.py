@@ -0,0 +1,212 @@
+"""Extractor routing: send each query to a yt-dlp instance configured for its kind.
+
+A single ``YoutubeDL`` with ``default_search`` makes every query pay for
+generic extractor matching and full format selection. The router classifies
+the input first and calls a pre-built instance with the matching extractor
+(``ie_key``) and the least work that route needs:
+
+- ``youtube_video`` / ``soundcloud_track``: metadata without format
+  selection (``process=False``); formats are chosen when the stream is resolved
+- ``youtube_playlist`` / ``soundcloud_set`` / ``search``: flat extraction, so
+  entries are listed without resolving each one
+- ``direct_media``: links to audio/video files skip yt-dlp entirely
+- ``generic``: anything else goes through the default extractor matching
+
+Instances are shared by every guild and built on first use. ``YoutubeDL``
+is not thread-safe (it keeps per-extraction playlist state on the instance),
+so each worker thread gets its own set.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+from urllib.parse import unquote, urlparse
+
+import yt_dlp as youtube_dl
+from yt_dlp.extractor import get_info_extractor
+
+from utils.config import YTDL_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+MEDIA_EXTENSIONS = ('.mp3', '.ogg', '.opus', '.m4a', '.aac', '.flac', '.wav', '.webm', '.mp4', '.mka')
+
+# Options every route starts from; YouTube-specific ones are added back per route
+_BASE_OPTIONS = {
+    key: value for key, value in YTDL_OPTIONS.items()
+    if key not in ('default_search', 'extractor_args')
+}
+_YOUTUBE_OPTIONS = {'extractor_args': YTDL_OPTIONS['extractor_args']}
+
+# route -> (yt-dlp extractor key, option overrides, run format processing for metadata)
+ROUTES = {
+    'youtube_video': ('Youtube', {**_YOUTUBE_OPTIONS, 'noplaylist': True}, False),
+    'youtube_playlist': ('YoutubeTab', {**_YOUTUBE_OPTIONS, 'extract_flat': 'in_playlist'}, True),
+    'soundcloud_track': ('Soundcloud', {'noplaylist': True}, False),
+    'soundcloud_set': ('SoundcloudSet', {'extract_flat': 'in_playlist'}, True),
+    'search': ('YoutubeSearch', {**_YOUTUBE_OPTIONS, 'extract_flat': 'in_playlist'}, True),
+    'generic': (None, dict(YTDL_OPTIONS), True),
+}
+
+# Searches the user prefixed themselves (e.g. "scsearch:", "ytsearch5:") are passed to yt-dlp as is
+_SEARCH_PREFIX = re.compile(r'^[a-z]*search[a-z]*(?:[1-9][0-9]*|all)?:', re.IGNORECASE)
+
+# URL routes, checked in order against their extractor's URL pattern
+_URL_ROUTES = ('youtube_video', 'youtube_playlist', 'soundcloud_track', 'soundcloud_set')
+
+
+def classify(query: str) -> str:
+    """Name of the route that handles a query."""
+    query = query.strip()
+    parsed = urlparse(query)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return 'search'
+    if parsed.path.lower().endswith(MEDIA_EXTENSIONS):
+        return 'direct_media'
+    for route in _URL_ROUTES:
+        if get_info_extractor(ROUTES[route][0]).suitable(query):
+            return route
+    return 'generic'
+
+
+class RouteStats:
+    """Latency of one route's extractions."""
+    
+    def __init__(self, samples: int = 200):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=samples)
+    
+    def record(self, seconds: float, ok: bool):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        if not ok:
+            self.errors += 1
+    
+    def percentile(self, fraction: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+    
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+        }
+
+
+def _fill_thumbnail(info: dict):
+    # Set during processing, so unprocessed and flat results only have the list
+    if not info.get('thumbnail') and info.get('thumbnails'):
+        info['thumbnail'] = info['thumbnails'][-1].get('url')
+
+
+class ExtractorRouter:
+    """Classifies queries and runs them on per-route yt-dlp instances.
+    
+    Methods block; call them from a worker thread. Each thread uses its own
+    instances.
+    """
+    
+    def __init__(self, factory: Callable[[dict], object] = youtube_dl.YoutubeDL):
+        self.factory = factory
+        self._local = threading.local()
+        # "<route>" for metadata extraction, "<route>:stream" for stream URL resolution
+        self.stats: Dict[str, RouteStats] = {}
+    
+    def _instance(self, route: str):
+        instances = getattr(self._local, 'instances', None)
+        if instances is None:
+            instances = self._local.instances = {}
+        instance = instances.get(route)
+        if instance is None:
+            instance = instances[route] = self.factory({**_BASE_OPTIONS, **ROUTES[route][1]})
+        return instance
+    
+    def _record(self, key: str, started: float, ok: bool):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats.setdefault(key, RouteStats())
+        stats.record(time.perf_counter() - started, ok)
+    
+    def extract(self, query: str) -> Optional[dict]:
+        """Track or playlist metadata for a query, in yt-dlp's info dict format."""
+        route = classify(query)
+        started = time.perf_counter()
+        ok = False
+        try:
+            if route == 'direct_media':
+                info = self._direct_media(query)
+            else:
+                info = self._extract(route, query)
+            ok = info is not None
+            return info
+        finally:
+            self._record(route, started, ok)
+    
+    def resolve_stream(self, webpage_url: str) -> str:
+        """A fresh, playable audio stream URL for a track."""
+        route = classify(webpage_url)
+        started = time.perf_counter()
+        ok = False
+        try:
+            if route == 'direct_media':
+                stream_url = webpage_url
+            else:
+                if route not in ('youtube_video', 'soundcloud_track'):
+                    route = 'generic'
+                info = self._instance(route).extract_info(
+                    webpage_url, download=False, ie_key=ROUTES[route][0]
+                )
+                if info and 'url' in info:
+                    stream_url = info['url']
+                elif info and info.get('entries'):
+                    stream_url = info['entries'][0]['url']
+                else:
+                    raise Exception("Could not extract audio URL")
+            ok = True
+            return stream_url
+        finally:
+            self._record(f'{route}:stream', started, ok)
+    
+    def _extract(self, route: str, query: str) -> Optional[dict]:
+        ie_key, _, process = ROUTES[route]
+        if route == 'search':
+            if _SEARCH_PREFIX.match(query):
+                ie_key = None  # Let yt-dlp pick the search extractor for the prefix
+            else:
+                query = f'ytsearch1:{query}'
+        info = self._instance(route).extract_info(query, download=False, ie_key=ie_key, process=process)
+        if info and not process and info.get('_type') in ('url', 'url_transparent'):
+            # The extractor handed off to another one; let yt-dlp follow it normally
+            logger.debug("Route %s redirected, falling back to generic extraction", route)
+            info = self._instance('generic').extract_info(query, download=False)
+        if info:
+            _fill_thumbnail(info)
+            if isinstance(info.get('entries'), list):
+                for entry in info['entries']:
+                    if entry:
+                        _fill_thumbnail(entry)
+        return info
+    
+    @staticmethod
+    def _direct_media(url: str) -> dict:
+        filename = os.path.basename(unquote(urlparse(url).path))
+        return {
+            'title': os.path.splitext(filename)[0] or url,
+            'url': url,
+            'webpage_url': url,
+            'duration': 0,
+        }
+    
+    def stats_summary(self) -> Dict[str, dict]:
+        return {key: stats.to_dict() for key, stats in sorted(self.stats.items())}
@@ -0,0 +1,408 @@
+"""Lavalink-protocol (v4) playback backend.
+
+Audio is loaded, decoded and sent to Discord by a remote audio node, so the
+bot process only handles the gateway. Tracks are loaded over REST
+(``/v4/loadtracks``), players are driven with ``PATCH /v4/sessions/.../players``
+and playback events arrive over the node's websocket.
+
+``LavalinkVoiceClient`` is the ``discord.VoiceProtocol`` the cog connects
+with: it forwards Discord voice credentials to the node and mimics the parts
+of ``discord.VoiceClient`` that ``MusicPlayer`` uses (play/stop/pause/resume,
+``source`` and the ``after`` callback).
+
+For local testing, run the stand-in node from ``tools/lavalink_standin.py``.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+import discord
+
+from utils.config import LAVALINK_URI, LAVALINK_PASSWORD
+from utils.playback import PlaybackBackend
+from utils.tracing import Span, span
+
+logger = logging.getLogger(__name__)
+
+# TrackEndEvent reasons after which the player should move on; the others
+# ('stopped', 'replaced', 'cleanup') are caused by our own requests
+_END_REASONS = ('finished', 'loadFailed')
+
+
+class LavalinkError(Exception):
+    """Raised when the audio node rejects a request or fails a track."""
+
+
+class LavalinkNode:
+    """Connection to one Lavalink-protocol audio node (REST + websocket)."""
+    
+    def __init__(self, uri: str, password: str, client_name: str = 'Proto-Discord'):
+        self.uri = uri.rstrip('/')
+        self.password = password
+        self.client_name = client_name
+        self.session_id: Optional[str] = None
+        self.players: Dict[int, 'LavalinkVoiceClient'] = {}
+        self.stats: dict = {}
+        self._user_id: Optional[int] = None
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._ws_task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+    
+    @property
+    def _ws_url(self) -> str:
+        parsed = urlparse(self.uri)
+        scheme = 'wss' if parsed.scheme == 'https' else 'ws'
+        return f"{scheme}://{parsed.netloc}/v4/websocket"
+    
+    async def connect(self, user_id: int):
+        """Open the HTTP session and keep a websocket to the node in the background."""
+        self._user_id = user_id
+        self._http = aiohttp.ClientSession(headers={'Authorization': self.password})
+        self._ws_task = asyncio.create_task(self._ws_loop())
+    
+    async def close(self):
+        if self._ws_task:
+            self._ws_task.cancel()
+            await asyncio.gather(self._ws_task, return_exceptions=True)
+        if self._http:
+            await self._http.close()
+    
+    async def wait_ready(self, timeout: float = 10.0):
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise LavalinkError(f"Audio node {self.uri} is not connected") from None
+    
+    async def _ws_loop(self):
+        """Keep the websocket open, reconnecting with backoff."""
+        backoff = 1
+        headers = {
+            'Authorization': self.password,
+            'User-Id': str(self._user_id),
+            'Client-Name': self.client_name,
+        }
+        while True:
+            try:
+                async with self._http.ws_connect(self._ws_url, headers=headers, heartbeat=30) as ws:
+                    backoff = 1
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            self._dispatch(message.json())
+                        elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Audio node %s connection failed: %s", self.uri, e)
+            
+            self._ready.clear()
+            self._fail_players('audio node connection lost')
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+    
+    def _dispatch(self, payload: dict):
+        op = payload.get('op')
+        if op == 'ready':
+            if not payload.get('resumed'):
+                # A new session has no players: anything still "playing" has to be restarted
+                self._fail_players('audio node session restarted')
+            self.session_id = payload['sessionId']
+            self._ready.set()
+            logger.info("Connected to audio node %s (session %s)", self.uri, self.session_id)
+        elif op == 'stats':
+            self.stats = payload
+        elif op in ('playerUpdate', 'event'):
+            voice_client = self.players.get(int(payload['guildId']))
+            if voice_client is None:
+                return
+            if op == 'playerUpdate':
+                voice_client._on_player_update(payload.get('state', {}))
+            else:
+                voice_client._on_event(payload)
+    
+    def _fail_players(self, reason: str):
+        for voice_client in list(self.players.values()):
+            voice_client._end(LavalinkError(reason))
+    
+    async def _request(self, method: str, path: str, **kwargs):
+        async with self._http.request(method, f"{self.uri}{path}", **kwargs) as response:
+            if response.status == 204:
+                return None
+            data = await response.json(content_type=None)
+            if response.status >= 400:
+                raise LavalinkError(f"{method} {path} failed ({response.status}): {data.get('message', data)}")
+            return data
+    
+    async def load_track(self, identifier: str) -> dict:
+        """Resolve an identifier (URL or search) to a single encoded track."""
+        data = await self._request('GET', '/v4/loadtracks', params={'identifier': identifier})
+        load_type = data.get('loadType')
+        if load_type == 'track':
+            return data['data']
+        if load_type == 'search' and data['data']:
+            return data['data'][0]
+        if load_type == 'playlist' and data['data']['tracks']:
+            return data['data']['tracks'][0]
+        if load_type == 'error':
+            raise LavalinkError(data['data'].get('message', 'Track failed to load'))
+        raise LavalinkError(f"No track found for {identifier}")
+    
+    async def update_player(self, guild_id: int, **fields):
+        await self.wait_ready()
+        return await self._request(
+            'PATCH',
+            f"/v4/sessions/{self.session_id}/players/{guild_id}",
+            params={'noReplace': 'false'},
+            json=fields
+        )
+    
+    async def destroy_player(self, guild_id: int):
+        if self.session_id and self._ready.is_set():
+            await self._request('DELETE', f"/v4/sessions/{self.session_id}/players/{guild_id}")
+
+
+class LavalinkSource:
+    """A track playing on the audio node; mirrors the source interface of ``TrackedAudio``."""
+    
+    def __init__(self, track: dict, volume: float = 0.5, start_offset: float = 0.0):
+        self.encoded = track['encoded']
+        self.info = track.get('info', {})
+        self.start_offset = start_offset
+        self.first_packet_span: Optional[Span] = None
+        self.voice_client: Optional['LavalinkVoiceClient'] = None
+        self._volume = volume
+        self._position = start_offset
+        self._position_at: Optional[float] = None  # When _position was last reported while playing
+    
+    @property
+    def volume(self) -> float:
+        return self._volume
+    
+    @volume.setter
+    def volume(self, value: float):
+        self._volume = max(value, 0.0)
+        if self.voice_client:
+            self.voice_client._send_update(volume=int(self._volume * 100))
+    
+    @property
+    def position(self) -> float:
+        """Seconds into the track, extrapolated from the node's last player update."""
+        if self._position_at is None:
+            return self._position
+        return self._position + (time.monotonic() - self._position_at)
+    
+    def _set_position(self, seconds: float, playing: bool):
+        self._position = seconds
+        self._position_at = time.monotonic() if playing else None
+    
+    def cleanup(self):
+        if self.first_packet_span and not self.first_packet_span.finished:
+            self.first_packet_span.finish(error='stream ended before the first packet')
+
+
+class LavalinkVoiceClient(discord.VoiceProtocol):
+    """Voice connection whose audio is produced by the Lavalink node."""
+    
+    def __init__(self, client, channel):
+        super().__init__(client, channel)
+        self.guild = channel.guild
+        self.node: LavalinkNode = client.playback_backend.node
+        self.source: Optional[LavalinkSource] = None
+        self._after = None
+        self._paused = False
+        self._voice: dict = {}
+        self._voice_ready = asyncio.Event()
+        self._update_lock = asyncio.Lock()  # Keeps stop-then-play requests in order
+        self._connected = False
+    
+    # Discord voice handshake: forward credentials to the node
+    
+    async def on_voice_server_update(self, data):
+        self._voice['token'] = data['token']
+        self._voice['endpoint'] = data['endpoint']
+        await self._voice_updated()
+    
+    async def on_voice_state_update(self, data):
+        if data.get('channel_id') is None:
+            # Disconnected (or kicked) from voice
+            await self._teardown()
+            return
+        self._voice['sessionId'] = data['session_id']
+        self.channel = self.guild.get_channel(int(data['channel_id'])) or self.channel
+        await self._voice_updated()
+    
+    async def _voice_updated(self):
+        if not all(key in self._voice for key in ('token', 'endpoint', 'sessionId')):
+            return
+        self._connected = True
+        self._voice_ready.set()
+        if self.source:
+            # Voice server moved while playing
+            self._send_update(voice=dict(self._voice))
+    
+    async def connect(self, *, timeout: float, reconnect: bool, self_deaf: bool = False,
+                      self_mute: bool = False):
+        self.node.players[self.guild.id] = self
+        # The node sends the audio, so the bot itself never needs to hear the channel
+        await self.guild.change_voice_state(channel=self.channel, self_mute=self_mute, self_deaf=True)
+        await asyncio.wait_for(self._voice_ready.wait(), timeout)
+    
+    async def disconnect(self, *, force: bool = False):
+        self.stop()
+        await self.guild.change_voice_state(channel=None)
+        await self._teardown()
+    
+    async def move_to(self, channel):
+        await self.guild.change_voice_state(channel=channel, self_deaf=True)
+    
+    async def _teardown(self):
+        if not self._connected and self.guild.id not in self.node.players:
+            return
+        self._connected = False
+        self._end(None)
+        self.node.players.pop(self.guild.id, None)
+        try:
+            await self.node.destroy_player(self.guild.id)
+        except Exception as e:
+            logger.warning("Failed to destroy player for guild %s: %s", self.guild.id, e)
+        self.cleanup()
+    
+    def is_connected(self) -> bool:
+        return self._connected
+    
+    # discord.VoiceClient-compatible playback controls
+    
+    def is_playing(self) -> bool:
+        return self.source is not None and not self._paused
+    
+    def is_paused(self) -> bool:
+        return self.source is not None and self._paused
+    
+    def play(self, source: LavalinkSource, *, after=None):
+        if self.source is not None:
+            raise discord.ClientException('Already playing audio.')
+        if not self._connected:
+            raise discord.ClientException('Not connected to voice.')
+        
+        self.source = source
+        self._after = after
+        self._paused = False
+        source.voice_client = self
+        self._send_update(
+            track={'encoded': source.encoded},
+            position=int(source.start_offset * 1000),
+            volume=int(source.volume * 100),
+            paused=False,
+            voice=dict(self._voice)
+        )
+    
+    def stop(self):
+        if self.source is None:
+            return
+        self._end(None)
+        self._send_update(track={'encoded': None})
+    
+    def pause(self):
+        if self.source is not None:
+            self._paused = True
+            self.source._set_position(self.source.position, playing=False)
+            self._send_update(paused=True)
+    
+    def resume(self):
+        if self.source is not None:
+            self._paused = False
+            self.source._set_position(self.source.position, playing=True)
+            self._send_update(paused=False)
+    
+    def _send_update(self, **fields):
+        asyncio.get_running_loop().create_task(self._update(fields))
+    
+    async def _update(self, fields: dict):
+        try:
+            async with self._update_lock:
+                await self.node.update_player(self.guild.id, **fields)
+        except Exception as e:
+            logger.warning("Audio node update failed for guild %s: %s", self.guild.id, e)
+            if 'track' in fields and fields['track']['encoded']:
+                self._end(LavalinkError(str(e)))
+    
+    def _end(self, error: Optional[Exception]):
+        """Finish the current source and run its ``after`` callback once."""
+        source, after = self.source, self._after
+        self.source = None
+        self._after = None
+        self._paused = False
+        if source is None:
+            return
+        source.voice_client = None
+        source.cleanup()
+        if after:
+            after(error)
+    
+    # Node events
+    
+    def _on_player_update(self, state: dict):
+        if self.source and 'position' in state:
+            self.source._set_position(state['position'] / 1000, playing=not self._paused)
+    
+    def _on_event(self, payload: dict):
+        event = payload.get('type')
+        track = payload.get('track') or {}
+        if not self.source or track.get('encoded') not in (None, self.source.encoded):
+            return
+        
+        if event == 'TrackStartEvent':
+            self.source._set_position(self.source.start_offset, playing=True)
+            if self.source.first_packet_span:
+                self.source.first_packet_span.finish()
+        elif event == 'TrackEndEvent':
+            if payload.get('reason') not in _END_REASONS:
+                return
+            if payload.get('reason') == 'finished' and self.source.info.get('length'):
+                self.source._set_position(self.source.info['length'] / 1000, playing=False)
+            self._end(None)
+        elif event == 'TrackExceptionEvent':
+            exception = payload.get('exception') or {}
+            self._end(LavalinkError(exception.get('message') or 'Track playback failed'))
+        elif event == 'TrackStuckEvent':
+            self._end(LavalinkError(f"Track stuck for {payload.get('thresholdMs', 0)} ms"))
+        elif event == 'WebSocketClosedEvent':
+            logger.warning("Node voice connection closed for guild %s: %s (%s)",
+                           self.guild.id, payload.get('reason'), payload.get('code'))
+
+
+class LavalinkBackend(PlaybackBackend):
+    """Plays audio on a remote Lavalink-protocol node."""
+    
+    name = 'lavalink'
+    voice_client_class = LavalinkVoiceClient
+    
+    def __init__(self, bot):
+        self.bot = bot
+        self.node = LavalinkNode(LAVALINK_URI, LAVALINK_PASSWORD)
+    
+    async def start(self):
+        await self.node.connect(self.bot.user.id)
+    
+    async def close(self):
+        await self.node.close()
+    
+    async def create_source(self, player, offset: float, volume: float,
+                            stream_url: Optional[str] = None) -> LavalinkSource:
+        with span('lavalink_load', url=player.current.webpage_url):
+            track = await self.node.load_track(player.current.webpage_url)
+        return LavalinkSource(track, volume=volume, start_offset=offset)
+    
+    def stats(self) -> dict:
+        node_stats = self.node.stats
+        return {
+            'backend': self.name,
+            'node': self.node.uri,
+            'connected': self.node._ready.is_set(),
+            'players': len(self.node.players),
+            'node_players': node_stats.get('playingPlayers'),
+            'node_cpu': (node_stats.get('cpu') or {}).get('lavalinkLoad'),
+        }
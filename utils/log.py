@@ -0,0 +1,167 @@
+"""Non-blocking structured logging for the bot.
+
+Log calls only put records on an in-memory queue; a background thread does
+the formatting and writing, so a slow or back-pressured stdout never blocks
+the event loop. Levels can be set per module, repeated messages are rate
+limited and records can be emitted as JSON lines.
+
+Configured from the environment (see utils/config.py):
+    LOG_LEVEL=INFO
+    LOG_LEVELS=utils.music_player=WARNING,discord=WARNING
+    LOG_FORMAT=json
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from utils.config import (
+    LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_REPEAT_LIMIT, LOG_REPEAT_WINDOW
+)
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_plain_formatter = logging.Formatter()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects, including ``extra`` fields."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Drops repeats of the same message template beyond a limit per time window.
+    
+    Records are keyed by logger, level and the unformatted message, so
+    per-entry chatter like "Adding track: %s" is limited as a whole. Errors
+    are never dropped. The first record after a window with drops carries a
+    ``suppressed`` count.
+    """
+    
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._counts: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.ERROR:
+            return True
+        
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._counts.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._counts[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                if len(self._counts) > 10000:
+                    # Forget stale keys so unique messages can't grow this forever
+                    self._counts = {
+                        k: v for k, v in self._counts.items() if now - v[0] < self.window
+                    }
+                return True
+            
+            state[1] += 1
+            if state[1] <= self.limit:
+                return True
+            state[2] += 1
+            return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render args and traceback now, since they may not survive the thread hop,
+        # but keep them apart so the writer can still format structured output
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """Parse ``"module=LEVEL,other.module=LEVEL"`` into logger levels."""
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a background writer thread.
+    
+    Safe to call more than once; later calls only adjust levels.
+    """
+    global _listener
+    
+    root = logging.getLogger()
+    root.setLevel(logging.getLevelName((level or LOG_LEVEL).upper()))
+    for name, module_level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(module_level)
+    
+    if _listener is not None:
+        return _listener
+    
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if (fmt or LOG_FORMAT).lower() == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)-7s %(name)s: %(message)s', '%Y-%m-%d %H:%M:%S'
+        ))
+    
+    queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RateLimitFilter(LOG_REPEAT_LIMIT, LOG_REPEAT_WINDOW))
+    
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,148 @@
+"""Loudness normalization: measure tracks once, apply the gain in FFmpeg afterwards.
+
+The first time a track plays, a background FFmpeg process measures its
+integrated loudness and true peak (EBU R128, the ``ebur128`` filter) from the
+same stream URL. The gain that brings it to ``LOUDNESS_TARGET`` is stored in a
+bounded LRU keyed by canonical URL. Later plays pass gain x volume to FFmpeg's
+``volume`` filter (see ``FFmpegBackend``), so no per-play analysis runs and
+Python does no per-frame scaling.
+"""
+import asyncio
+import logging
+import math
+import re
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from utils.config import (
+    LOUDNESS_TARGET, LOUDNESS_MAX_GAIN, LOUDNESS_CACHE_SIZE,
+    LOUDNESS_ANALYSIS_WORKERS, LOUDNESS_ANALYSIS_SECONDS, LOUDNESS_MAX_PENDING
+)
+
+logger = logging.getLogger(__name__)
+
+_INTEGRATED = re.compile(r'I:\s+(-?[\d.]+) LUFS')
+_TRUE_PEAK = re.compile(r'Peak:\s+(-?[\d.]+|-inf) dBFS')
+
+# Keep true peaks this far below full scale after applying gain
+_PEAK_HEADROOM = 1.0
+# Integrated loudness of (near) silence; such tracks are left alone
+_SILENCE = -70.0
+
+
+def gain_for(integrated: float, true_peak: Optional[float]) -> float:
+    """Gain (dB) that brings a track to the target loudness without clipping its peaks."""
+    if integrated <= _SILENCE:
+        return 0.0
+    gain = LOUDNESS_TARGET - integrated
+    if true_peak is not None:
+        gain = min(gain, -_PEAK_HEADROOM - true_peak)
+    return max(-LOUDNESS_MAX_GAIN, min(gain, LOUDNESS_MAX_GAIN))
+
+
+def volume_factor(volume: float, gain_db: float) -> float:
+    """Linear factor for FFmpeg's volume filter combining user volume and gain."""
+    return volume * math.pow(10, gain_db / 20)
+
+
+class GainCache:
+    """Bounded LRU of track gains (dB) keyed by canonical URL."""
+    
+    def __init__(self, max_size: int = LOUDNESS_CACHE_SIZE):
+        self.max_size = max_size
+        self._gains: OrderedDict = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._gains)
+    
+    def get(self, key: str) -> Optional[float]:
+        gain = self._gains.get(key)
+        if gain is not None:
+            self._gains.move_to_end(key)
+        return gain
+    
+    def set(self, key: str, gain: float):
+        self._gains[key] = gain
+        self._gains.move_to_end(key)
+        while len(self._gains) > self.max_size:
+            self._gains.popitem(last=False)
+
+
+class LoudnessAnalyzer:
+    """Runs background EBU R128 measurements and caches the resulting gains."""
+    
+    def __init__(self, workers: int = LOUDNESS_ANALYSIS_WORKERS, max_pending: int = LOUDNESS_MAX_PENDING):
+        self.cache = GainCache()
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(workers)
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats: Dict[str, int] = {'analyzed': 0, 'failed': 0, 'skipped': 0}
+    
+    def gain(self, key: str) -> Optional[float]:
+        """Cached gain for a track, or None if it hasn't been measured."""
+        return self.cache.get(key)
+    
+    def schedule(self, key: str, stream_url: str, before_options: str = ''):
+        """Measure a track in the background unless it is cached or already queued.
+        
+        When ``max_pending`` measurements are already running or waiting, the
+        track is skipped; it is scheduled again the next time it plays. A longer
+        backlog would only hold stream URLs that expire before their turn.
+        """
+        if not key or key in self._pending or self.cache.get(key) is not None:
+            return
+        if len(self._pending) >= self.max_pending:
+            self.stats['skipped'] += 1
+            return
+        self._pending.add(key)
+        task = asyncio.create_task(self._analyze(key, stream_url, before_options))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _analyze(self, key: str, stream_url: str, before_options: str):
+        try:
+            async with self._slots:
+                integrated, true_peak = await self._measure(stream_url, before_options)
+            gain = gain_for(integrated, true_peak)
+            self.cache.set(key, gain)
+            self.stats['analyzed'] += 1
+            logger.debug("Loudness of %s: %.1f LUFS, peak %s dBFS -> gain %+.1f dB",
+                         key, integrated, true_peak, gain)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.warning("Loudness analysis failed for %s: %s", key, e)
+        finally:
+            self._pending.discard(key)
+    
+    async def _measure(self, stream_url: str, before_options: str):
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-hide_banner', '-nostats', '-nostdin', *before_options.split(),
+            '-t', str(LOUDNESS_ANALYSIS_SECONDS), '-i', stream_url,
+            '-vn', '-af', 'ebur128=peak=true:framelog=verbose', '-f', 'null', '-',
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        output = stderr.decode(errors='replace')
+        
+        integrated = _INTEGRATED.findall(output)
+        if process.returncode != 0 or not integrated:
+            raise RuntimeError(f"ffmpeg exited with {process.returncode}: {output.strip()[-200:]}")
+        # The summary comes last; earlier matches would be per-frame values
+        peaks = _TRUE_PEAK.findall(output)
+        true_peak = float(peaks[-1]) if peaks and peaks[-1] != '-inf' else None
+        return float(integrated[-1]), true_peak
+    
+    async def close(self):
+        """Cancel running analyses."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
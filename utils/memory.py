@@ -0,0 +1,36 @@
+"""Process memory and gateway cache size measurements."""
+import os
+import resource
+import sys
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Not Linux: the peak is the closest we can get
+        return peak_rss_mb()
+
+
+def cache_counts(client) -> dict:
+    """Number of objects in a client's gateway cache, by kind."""
+    guilds = client.guilds
+    return {
+        'guilds': len(guilds),
+        'channels': sum(len(guild.channels) for guild in guilds),
+        'roles': sum(len(guild.roles) for guild in guilds),
+        'members': sum(len(guild.members) for guild in guilds),
+        'users': len(client.users),
+        'emojis': len(client.emojis),
+        'messages': len(client.cached_messages),
+    }
@@ -1,9 +1,32 @@
 """Music player logic and queue management."""
 import asyncio
+import logging
 import discord
-import yt_dlp as youtube_dl
 from typing import Optional, List
-from utils.config import YTDL_OPTIONS, FFMPEG_OPTIONS
+from utils.config import STREAM_MAX_RETRIES, STREAM_RESUME_TOLERANCE
+from utils.tracing import Span, span, start_span
+from utils.track_queue import FairTrackQueue, TrackQueue, canonical_url
+
+logger = logging.getLogger(__name__)
+
+# Seconds of audio in each frame delivered to the voice client
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+
+
+def format_time(seconds) -> str:
+    """Format seconds in MM:SS or HH:MM:SS format."""
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class StreamCancelled(Exception):
+    """The track changed (skip, stop, leave) while its stream was being opened."""
+    
+    def __init__(self):
+        super().__init__("Playback was stopped while the stream was loading")
 
 
 class Track:
@@ -17,41 +40,193 @@ class Track:
         self.duration = duration
         self.thumbnail = thumbnail
         self.requester = requester
+        self.canonical_url = canonical_url(webpage_url)
     
     def format_duration(self) -> str:
         """Format duration in MM:SS or HH:MM:SS format."""
         if self.duration:
-            hours, remainder = divmod(self.duration, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            if hours > 0:
-                return f"{int(hours)}:{int(minutes):02d}:{int(seconds):02d}"
-            return f"{int(minutes)}:{int(seconds):02d}"
+            return format_time(self.duration)
         return "Unknown"
 
 
+class TrackedAudio(discord.PCMVolumeTransformer):
+    """Volume-controlled source that tracks playback position from delivered frames."""
+    
+    def __init__(self, original: discord.AudioSource, volume: float = 0.5, start_offset: float = 0.0,
+                 first_packet_span: Optional[Span] = None):
+        super().__init__(original, volume=volume)
+        self.start_offset = start_offset
+        self.frames = 0
+        self.first_packet_span = first_packet_span
+    
+    def read(self) -> bytes:
+        data = super().read()
+        if data:
+            self.frames += 1
+            if self.frames == 1 and self.first_packet_span:
+                self.first_packet_span.finish()
+        return data
+    
+    def cleanup(self) -> None:
+        if self.first_packet_span and not self.first_packet_span.finished:
+            self.first_packet_span.finish(error='stream ended before the first packet')
+        super().cleanup()
+    
+    @property
+    def position(self) -> float:
+        """Seconds into the track of the last delivered frame."""
+        return self.start_offset + self.frames * FRAME_SECONDS
+
+
+class NormalizedAudio(discord.AudioSource):
+    """Opus source whose loudness gain and volume are applied inside FFmpeg.
+    
+    Python only forwards encoded packets. A new ``volume`` takes effect when the
+    stream restarts, which ``MusicPlayer.set_volume`` does (``restart_on_volume``).
+    """
+    
+    restart_on_volume = True
+    
+    def __init__(self, original: discord.FFmpegOpusAudio, volume: float, gain_db: float, stream_url: str,
+                 start_offset: float = 0.0, first_packet_span: Optional[Span] = None):
+        self.original = original
+        self.volume = volume
+        self.gain_db = gain_db
+        self.stream_url = stream_url
+        self.start_offset = start_offset
+        self.frames = 0
+        self.first_packet_span = first_packet_span
+    
+    def read(self) -> bytes:
+        data = self.original.read()
+        if data:
+            self.frames += 1
+            if self.frames == 1 and self.first_packet_span:
+                self.first_packet_span.finish()
+        return data
+    
+    def is_opus(self) -> bool:
+        return True
+    
+    def cleanup(self) -> None:
+        if self.first_packet_span and not self.first_packet_span.finished:
+            self.first_packet_span.finish(error='stream ended before the first packet')
+        self.original.cleanup()
+    
+    @property
+    def position(self) -> float:
+        """Seconds into the track of the last delivered frame."""
+        return self.start_offset + self.frames * FRAME_SECONDS
+
+
 class MusicPlayer:
     """Manages the music queue and playback for a guild."""
     
     def __init__(self, ctx):
         self.ctx = ctx
-        self.queue: List[Track] = []
+        self.queue = TrackQueue()
         self.current: Optional[Track] = None
         self.voice_client: Optional[discord.VoiceClient] = None
-        self.ytdl = youtube_dl.YoutubeDL(YTDL_OPTIONS)
         self.is_playing = False
         self.loop = False
+        self.allow_duplicates = True
+        self.requester_weights = {}  # Member ID -> weight, used by the fair-share queue (from settings)
+        self.source = None  # Source from the playback backend (see utils/playback.py)
+        self._stream_id = 0  # Identifies the active stream so stale callbacks are ignored
+        self._retries = 0
+        self._user_stopped = False
+        self.apply_settings(self.settings)
+    
+    @property
+    def extractors(self):
+        """The bot's shared extractor router (see utils/extractors.py)."""
+        return self.ctx.bot.extractors
+    
+    @property
+    def settings(self):
+        """This guild's settings (see utils/settings.py)."""
+        return self.ctx.bot.settings.get(self.ctx.guild.id)
+    
+    def apply_settings(self, settings, names=('dedupe', 'fair_share', 'fair_weights')):
+        """Adopt the guild's queue policies, or only the named ones."""
+        if 'dedupe' in names:
+            self.allow_duplicates = not settings.dedupe
+        if 'fair_weights' in names:
+            # Updated in place: the fair-share queue holds this dict
+            self.requester_weights.clear()
+            self.requester_weights.update(settings.fair_weights)
+        if 'fair_share' in names:
+            self.set_fair_share(settings.fair_share)
     
-    async def add_track(self, query: str, requester: discord.Member):
+    def queue_full(self) -> bool:
+        """Whether the queue has reached the guild's maximum length."""
+        max_queue = self.settings.max_queue
+        return bool(max_queue) and len(self.queue) >= max_queue
+    
+    @property
+    def fair_share(self) -> bool:
+        """Whether the queue interleaves tracks across requesters."""
+        return isinstance(self.queue, FairTrackQueue)
+    
+    def set_fair_share(self, enabled: bool):
+        """Switch between FIFO and fair-share scheduling, keeping queued tracks."""
+        if enabled == self.fair_share:
+            return
+        queue = FairTrackQueue(self.requester_weights) if enabled else TrackQueue()
+        for track in self.queue:
+            queue.append(track)
+        self.queue = queue
+    
+    def upcoming(self, count: int) -> List[tuple]:
+        """The next count tracks in play order, each with seconds until it starts.
+        
+        The wait is None once an earlier track has an unknown duration.
+        """
+        if self.current:
+            wait = max(self.current.duration - self.position, 0) if self.current.duration else None
+        else:
+            wait = 0.0
+        result = []
+        for track in self.queue.peek(count):
+            result.append((track, wait))
+            wait = wait + track.duration if wait is not None and track.duration else None
+        return result
+    
+    def queue_position(self, track: Track) -> tuple:
+        """(1-based position, seconds until it starts) of a queued track, or (None, None)."""
+        for position, (queued, wait) in enumerate(self.upcoming(len(self.queue)), 1):
+            if queued is track:
+                return position, wait
+        return None, None
+    
+    def is_queued(self, url: str) -> bool:
+        """Whether this URL is the current track or already in the queue."""
+        if self.current and self.current.canonical_url == canonical_url(url):
+            return True
+        return self.queue.contains(url)
+    
+    async def add_track(self, query: str, requester: discord.Member, allow_duplicates: Optional[bool] = None):
         """Extract track information and add to queue.
         
+        With duplicates disallowed (``allow_duplicates=False``, or the player's
+        ``allow_duplicates`` policy when None), tracks already queued are
+        skipped, and playlist entries are checked before they are re-extracted.
+        Tracks stop being added once the queue reaches the guild's ``max_queue``.
+        
         Returns:
-            dict: {'tracks': [Track], 'is_playlist': bool, 'playlist_name': str or None}
+            dict: {'tracks': [Track], 'is_playlist': bool, 'playlist_name': str or None,
+                   'skipped': int, 'full': bool}
             or None if failed
         """
+        if allow_duplicates is None:
+            allow_duplicates = self.allow_duplicates
+        if self.queue_full():
+            return {'tracks': [], 'is_playlist': False, 'playlist_name': None, 'skipped': 0, 'full': True}
         try:
             # Run yt-dlp in executor to avoid blocking
-            print(f"Fetching info for: {query}")
-            data = await asyncio.to_thread(self._extract_info, query)
+            logger.info("Fetching info for: %s", query, extra={'guild_id': self.ctx.guild.id})
+            with span('extraction', query=query):
+                data = await asyncio.to_thread(self._extract_info, query)
             
             if data is None:
                 return None
@@ -61,122 +236,172 @@ class MusicPlayer:
                 # Get first entry for single track or first in playlist
                 if data['entries']:
                     tracks_added = []
+                    skipped = 0
+                    full = False
                     for entry in data['entries']:
+                        if self.queue_full():
+                            full = True
+                            break
                         if entry:
                             # Check if entry has minimal required data
                             # If not (like with flat extraction), we need the URL to re-extract
-                            entry_url = entry.get('webpage_url') or entry.get('url') or entry.get('id')
+                            entry_url = self._entry_url(entry)
                             entry_title = entry.get('title', 'Unknown Title')
                             
                             if not entry_url:
-                                print(f"Skipping entry without URL: {entry_title}")
+                                logger.debug("Skipping entry without URL: %s", entry_title)
+                                continue
+                            
+                            if not allow_duplicates and self.is_queued(entry_url):
+                                skipped += 1
                                 continue
                             
                             # If we don't have full info (title, duration, etc), extract it now
                             if entry_title == 'Unknown Title' or not entry.get('duration'):
-                                print(f"Extracting full info for: {entry_url}")
+                                logger.debug("Extracting full info for: %s", entry_url)
                                 try:
-                                    full_data = await asyncio.to_thread(
-                                        self.ytdl.extract_info, 
-                                        entry_url, 
-                                        download=False
-                                    )
+                                    with span('entry_extraction', url=entry_url):
+                                        full_data = await asyncio.to_thread(
+                                            self.extractors.extract,
+                                            entry_url
+                                        )
                                     if full_data:
                                         entry = full_data
                                 except Exception as e:
-                                    print(f"Failed to extract full info for {entry_url}: {e}")
+                                    logger.warning("Failed to extract full info for %s: %s", entry_url, e)
                                     continue
                             
-                            print(f"Adding track: {entry.get('title', 'Unknown')} | URL: {entry.get('webpage_url', 'N/A')}")
+                            logger.debug("Adding track: %s | URL: %s",
+                                         entry.get('title', 'Unknown'), entry.get('webpage_url', 'N/A'))
                             track = self._create_track(entry, requester)
                             self.queue.append(track)
                             tracks_added.append(track)
                     
-                    if tracks_added:
+                    if tracks_added or skipped:
                         return {
                             'tracks': tracks_added,
                             'is_playlist': len(tracks_added) > 1,
-                            'playlist_name': data.get('title', 'Playlist')
+                            'playlist_name': data.get('title', 'Playlist'),
+                            'skipped': skipped,
+                            'full': full
                         }
                 return None
             else:
                 # Single track
-                print(f"Adding track: {data.get('title', 'Unknown')} | URL: {data.get('webpage_url', 'N/A')}")
+                if not allow_duplicates and self.is_queued(self._entry_url(data)):
+                    return {'tracks': [], 'is_playlist': False, 'playlist_name': None, 'skipped': 1, 'full': False}
+                logger.debug("Adding track: %s | URL: %s",
+                             data.get('title', 'Unknown'), data.get('webpage_url', 'N/A'))
                 track = self._create_track(data, requester)
                 self.queue.append(track)
                 return {
                     'tracks': [track],
                     'is_playlist': False,
-                    'playlist_name': None
+                    'playlist_name': None,
+                    'skipped': 0,
+                    'full': False
                 }
                 
         except Exception as e:
-            print(f"Error adding track: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error adding track: %s", e, extra={'guild_id': self.ctx.guild.id})
             return None
     
     def _extract_info(self, query: str):
-        """Extract information using yt-dlp."""
+        """Extract information using the yt-dlp instance routed for this query."""
         try:
-            return self.ytdl.extract_info(query, download=False)
+            return self.extractors.extract(query)
         except Exception as e:
-            print(f"yt-dlp error: {e}")
+            logger.warning("yt-dlp error: %s", e)
             return None
     
+    @staticmethod
+    def _entry_url(data: dict) -> str:
+        """Best available identifier for re-extraction."""
+        return data.get('webpage_url') or data.get('url') or data.get('id', '')
+    
     def _create_track(self, data: dict, requester: discord.Member) -> Track:
         """Create a Track object from yt-dlp data."""
-        # Get the best available identifier for re-extraction
-        webpage_url = data.get('webpage_url') or data.get('url') or data.get('id', '')
-        
         return Track(
             title=data.get('title', 'Unknown Title'),
             url=data.get('url', ''),
-            webpage_url=webpage_url,
+            webpage_url=self._entry_url(data),
             duration=data.get('duration', 0),
             thumbnail=data.get('thumbnail'),
             requester=requester
         )
     
+    @property
+    def position(self) -> float:
+        """Seconds elapsed in the current track."""
+        if self.source:
+            return self.source.position
+        return 0.0
+    
+    async def _resolve_audio_url(self) -> str:
+        """Re-extract a fresh audio stream URL for the current track."""
+        # Always re-extract fresh URL for reliability
+        # (Cached URLs often expire or are webpage URLs, not audio streams)
+        if not self.current.webpage_url or not self.current.webpage_url.startswith('http'):
+            raise Exception("Invalid webpage URL - cannot extract audio")
+        
+        logger.debug("Extracting fresh audio URL for: %s", self.current.webpage_url)
+        with span('fresh_extraction', url=self.current.webpage_url):
+            return await asyncio.to_thread(self.extractors.resolve_stream, self.current.webpage_url)
+    
+    async def _start_stream(self, offset: float = 0.0, volume: Optional[float] = None,
+                            stream_url: Optional[str] = None):
+        """Start the current track at the given offset (seconds) on the playback backend.
+        
+        ``volume`` defaults to the current source's; ``stream_url`` reuses an
+        already resolved stream instead of resolving a fresh one.
+        """
+        if volume is None:
+            volume = self.source.volume if self.source else self.settings.volume / 100
+        track = self.current
+        source = await self.ctx.bot.playback_backend.create_source(self, offset, volume, stream_url)
+        if self.current is not track:
+            source.cleanup()
+            raise StreamCancelled()
+        source.first_packet_span = start_span('first_packet')
+        
+        self._stream_id += 1
+        stream_id = self._stream_id
+        self.source = source
+        
+        # Replacing a live stream (seek/volume): stop it first, its callback is stale now
+        paused = self.voice_client.is_paused()
+        replaced = self.voice_client.is_playing() or paused
+        if replaced:
+            self.voice_client.stop()
+        
+        try:
+            self.voice_client.play(
+                source,
+                after=lambda e: asyncio.run_coroutine_threadsafe(
+                    self._after_playing(e, stream_id), self.ctx.bot.loop
+                )
+            )
+        except Exception as e:
+            source.cleanup()
+            if replaced:
+                # The old stream is gone and its callback ignored, so handle this like
+                # a dropped stream (resume or move on) rather than leave the player idle
+                asyncio.create_task(self._after_playing(e, stream_id))
+            raise
+        if paused:
+            # A seek while paused moves the position but stays paused
+            self.voice_client.pause()
+    
     async def play_next(self):
         """Play the next track in the queue."""
         if len(self.queue) > 0:
-            self.current = self.queue.pop(0)
+            self.current = self.queue.popleft()
             self.is_playing = True
+            self.source = None
+            self._retries = 0
             
             try:
-                # Always re-extract fresh URL for reliability
-                # (Cached URLs often expire or are webpage URLs, not audio streams)
-                if not self.current.webpage_url or not self.current.webpage_url.startswith('http'):
-                    raise Exception("Invalid webpage URL - cannot extract audio")
-                
-                print(f"Extracting fresh audio URL for: {self.current.webpage_url}")
-                fresh_data = await asyncio.to_thread(
-                    self.ytdl.extract_info, 
-                    self.current.webpage_url, 
-                    download=False
-                )
-                
-                if fresh_data and 'url' in fresh_data:
-                    audio_url = fresh_data['url']
-                elif fresh_data and 'entries' in fresh_data and fresh_data['entries']:
-                    audio_url = fresh_data['entries'][0]['url']
-                else:
-                    raise Exception("Could not extract audio URL")
-                
-                print(f"Playing audio from: {audio_url[:100]}...")
-                
-                # Create FFmpeg audio source with fresh URL
-                source = discord.FFmpegPCMAudio(audio_url, **FFMPEG_OPTIONS)
-                source = discord.PCMVolumeTransformer(source, volume=0.5)
-                
-                # Play the audio
-                self.voice_client.play(
-                    source,
-                    after=lambda e: asyncio.run_coroutine_threadsafe(
-                        self._after_playing(e), self.ctx.bot.loop
-                    )
-                )
+                await self._start_stream()
                 
                 # Send now playing message
                 embed = discord.Embed(
@@ -191,29 +416,105 @@ class MusicPlayer:
                 
                 await self.ctx.send(embed=embed)
                 
+            except StreamCancelled:
+                return
             except Exception as e:
-                print(f"Error playing track: {e}")
+                logger.error("Error playing track: %s", e, extra={'guild_id': self.ctx.guild.id})
                 await self.ctx.send(f"❌ Error playing track: {str(e)}")
                 self.is_playing = False
                 await self.play_next()
         else:
             self.is_playing = False
             self.current = None
+            self.source = None
+    
+    def _voice_connected(self) -> bool:
+        return self.voice_client is not None and self.voice_client.is_connected()
+    
+    def _ended_early(self) -> bool:
+        """Whether the current stream stopped well before the end of the track."""
+        if not self.current or not self.current.duration or not self.source:
+            return False
+        return self.source.position < self.current.duration - STREAM_RESUME_TOLERANCE
     
-    async def _after_playing(self, error):
+    async def _resume_stream(self) -> bool:
+        """Restart a dropped stream at its last position, with bounded retries."""
+        if self.source and self.source.position > self.source.start_offset:
+            # The stream made progress since the last drop, so start counting afresh
+            self._retries = 0
+        while self._retries < STREAM_MAX_RETRIES:
+            if not self._voice_connected():
+                return True  # Disconnected meanwhile; nothing to resume into
+            self._retries += 1
+            position = self.position
+            logger.warning("Stream dropped at %s, resuming (attempt %d/%d)",
+                           format_time(position), self._retries, STREAM_MAX_RETRIES,
+                           extra={'guild_id': self.ctx.guild.id})
+            try:
+                await self._start_stream(position)
+                return True
+            except StreamCancelled:
+                return True
+            except Exception as e:
+                logger.warning("Failed to resume stream: %s", e, extra={'guild_id': self.ctx.guild.id})
+        return False
+    
+    async def _after_playing(self, error, stream_id: int):
         """Callback after a track finishes playing."""
+        if stream_id != self._stream_id:
+            # A seek or resume replaced this stream
+            return
+        
         if error:
-            print(f"Player error: {error}")
+            logger.error("Player error: %s", error, extra={'guild_id': self.ctx.guild.id})
+        
+        user_stopped = self._user_stopped
+        self._user_stopped = False
+        
+        if not self._voice_connected():
+            # Disconnected (!leave, idle timeout, kick, shutdown): the stream didn't drop,
+            # so don't resume it or start the next track
+            self.is_playing = False
+            return
+        
+        # FFmpeg exits cleanly when the connection dies, so a short track also counts as dropped
+        if not user_stopped and self.current and (error or self._ended_early()):
+            if await self._resume_stream():
+                return
+            await self.ctx.send(f"⚠️ Lost the stream for **{self.current.title}**, skipping ahead.")
         
         self.is_playing = False
         
         # If loop is enabled, re-add the current track
         if self.loop and self.current:
-            self.queue.insert(0, self.current)
+            self.queue.appendleft(self.current)
         
         # Play next track
         await self.play_next()
     
+    async def seek(self, position: float) -> bool:
+        """Restart the current track at the given position (seconds)."""
+        if not self.current or not self.voice_client:
+            return False
+        if self.current.duration and position >= self.current.duration:
+            return False
+        
+        self._retries = 0
+        await self._start_stream(max(position, 0.0))
+        return True
+    
+    async def set_volume(self, volume: float) -> bool:
+        """Set the current track's volume (1.0 = 100%)."""
+        if not self.source:
+            return False
+        if getattr(self.source, 'restart_on_volume', False) and self.current:
+            # Volume is baked into the FFmpeg command, so restart where we are on the
+            # same stream URL; the source only takes the new volume if that works
+            await self._start_stream(self.position, volume, self.source.stream_url)
+        else:
+            self.source.volume = volume
+        return True
+    
     def pause(self):
         """Pause the current playback."""
         if self.voice_client and self.voice_client.is_playing():
@@ -231,6 +532,7 @@ class MusicPlayer:
     def skip(self):
         """Skip the current track."""
         if self.voice_client and self.voice_client.is_playing():
+            self._user_stopped = True
             self.voice_client.stop()
             return True
         return False
@@ -240,13 +542,18 @@ class MusicPlayer:
         self.queue.clear()
         self.current = None
         self.is_playing = False
-        if self.voice_client:
+        if self.voice_client and (self.voice_client.is_playing() or self.voice_client.is_paused()):
+            self._user_stopped = True
             self.voice_client.stop()
     
     def clear_queue(self):
         """Clear the queue without stopping current track."""
         self.queue.clear()
     
+    def remove_duplicates(self) -> int:
+        """Remove queued repeats of other queued tracks or the current one."""
+        return self.queue.remove_duplicates(self.current)
+    
     def get_queue(self) -> List[Track]:
         """Get the current queue."""
         return self.queue.copy()
@@ -0,0 +1,123 @@
+"""Playback backends behind ``MusicPlayer``.
+
+A backend turns the player's current track into a playable source and
+provides the voice client class the cog connects with. ``MusicPlayer`` only
+relies on the source/voice-client interface it already used with discord.py:
+
+- the voice client has ``play(source, after=...)``, ``stop()``, ``pause()``,
+  ``resume()``, ``is_playing()``, ``is_paused()`` and ``source``
+- the source has ``volume`` (read/write), ``position``, ``start_offset``,
+  ``first_packet_span`` and ``cleanup()``; sources with ``restart_on_volume``
+  only apply a new volume when the stream is restarted, and keep the URL they
+  play in ``stream_url`` so the restart can skip stream resolution
+
+``FFmpegBackend`` is the in-process path (FFmpeg + discord.py voice, optionally
+encoded by the audio worker pool). ``LavalinkBackend`` (utils/lavalink.py)
+hands playback to a remote Lavalink-protocol audio node.
+"""
+from typing import Optional
+
+import discord
+
+from utils.config import PLAYBACK_BACKEND, FFMPEG_OPTIONS
+from utils.loudness import volume_factor
+from utils.music_player import NormalizedAudio, TrackedAudio
+from utils.tracing import span
+
+
+class PlaybackBackend:
+    """Interface for the component that produces a guild's audio."""
+    
+    name = 'base'
+    # Passed as ``cls`` to ``VoiceChannel.connect``
+    voice_client_class = discord.VoiceClient
+    
+    async def start(self):
+        """Connect to any external resources (called from ``setup_hook``)."""
+    
+    async def close(self):
+        """Release external resources (called when the bot closes)."""
+    
+    async def create_source(self, player, offset: float, volume: float, stream_url: Optional[str] = None):
+        """Return a source for ``player.current`` starting at offset seconds.
+        
+        ``stream_url`` is an already resolved stream for the track, when the
+        player restarts one. Raises on failure; the player reports the error
+        and moves on.
+        """
+        raise NotImplementedError
+    
+    def stats(self) -> dict:
+        """Backend-specific health and load information."""
+        return {'backend': self.name}
+
+
+class FFmpegBackend(PlaybackBackend):
+    """In-process playback: yt-dlp stream URL -> FFmpeg -> discord.py voice.
+    
+    Tracks with a measured loudness gain (see utils/loudness.py) take the
+    normalized path: FFmpeg applies gain x volume and encodes Opus itself.
+    Others play as before and are queued for background analysis.
+    """
+    
+    name = 'ffmpeg'
+    
+    def __init__(self, bot):
+        self.bot = bot
+    
+    async def create_source(self, player, offset: float, volume: float, stream_url: Optional[str] = None):
+        audio_url = stream_url or await player._resolve_audio_url()
+        
+        options = dict(FFMPEG_OPTIONS)
+        if offset > 0:
+            # Input seeking goes before -i so FFmpeg skips ahead without decoding
+            options['before_options'] = f"-ss {offset:.2f} {options['before_options']}"
+        
+        loudness = self.bot.loudness if player.settings.normalize else None
+        gain = loudness.gain(player.current.canonical_url) if loudness else None
+        if gain is not None:
+            options['options'] = f"{options['options']} -af volume={volume_factor(volume, gain):.4f}"
+            with span('ffmpeg_spawn', offset=offset, normalized=True):
+                return NormalizedAudio(
+                    discord.FFmpegOpusAudio(audio_url, **options),
+                    volume=volume,
+                    gain_db=gain,
+                    stream_url=audio_url,
+                    start_offset=offset
+                )
+        if loudness:
+            loudness.schedule(player.current.canonical_url, audio_url, FFMPEG_OPTIONS['before_options'])
+        
+        audio_pool = self.bot.audio_pool
+        with span('ffmpeg_spawn', offset=offset, worker_pool=audio_pool is not None):
+            if audio_pool:
+                # Decode, volume and Opus encoding happen in a worker process
+                return audio_pool.open_source(
+                    audio_url,
+                    options['before_options'],
+                    options['options'],
+                    volume=volume,
+                    start_offset=offset
+                )
+            return TrackedAudio(
+                discord.FFmpegPCMAudio(audio_url, **options),
+                volume=volume,
+                start_offset=offset
+            )
+    
+    def stats(self) -> dict:
+        return {
+            'backend': self.name,
+            'audio_workers': len(self.bot.audio_pool.workers) if self.bot.audio_pool else 0,
+            'loudness_cached': len(self.bot.loudness.cache) if self.bot.loudness else 0,
+        }
+
+
+def create_backend(bot) -> PlaybackBackend:
+    """Build the backend selected by ``PLAYBACK_BACKEND``."""
+    if PLAYBACK_BACKEND == 'lavalink':
+        from utils.lavalink import LavalinkBackend
+        return LavalinkBackend(bot)
+    if PLAYBACK_BACKEND != 'ffmpeg':
+        raise ValueError(f"Unknown PLAYBACK_BACKEND: {PLAYBACK_BACKEND!r} (expected 'ffmpeg' or 'lavalink')")
+    return FFmpegBackend(bot)
@@ -0,0 +1,148 @@
+"""In-place reload of cogs and player code without dropping voice sessions.
+
+``reload_code`` re-executes the player modules and every loaded cog inside
+their existing module objects, then points live objects (players, queues,
+tracks, sources, the playback backend) at the new class versions by swapping
+their ``__class__``. Their state is untouched, so voice connections, queues
+and playing streams carry on under the new code.
+
+Everything is compiled before anything changes, and if a module or cog fails
+to load, every module namespace and cog is restored to what it was.
+
+Modules that own process-wide state (config, logging, tracing, settings, the
+audio worker pool, the Lavalink node) are not reloaded, so their singletons
+stay in place; changes to them still need a restart.
+"""
+import asyncio
+import gc
+import importlib
+import logging
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Reloaded in this order (dependencies first), before the cogs
+RELOADABLE_MODULES = (
+    'utils.track_queue',
+    'utils.extractors',
+    'utils.loudness',
+    'utils.checks',
+    'utils.music_player',
+    'utils.playback',
+)
+
+_lock = asyncio.Lock()
+
+
+class ReloadError(Exception):
+    """A reload failed and was rolled back."""
+    
+    def __init__(self, module: str, error: Exception):
+        super().__init__(f"{module}: {type(error).__name__}: {error}")
+        self.module = module
+        self.error = error
+
+
+def _check_source(module):
+    """Compile a module's current source, raising on syntax errors."""
+    spec = module.__spec__
+    source = spec.loader.get_source(spec.name)
+    compile(source, spec.origin, 'exec')
+
+
+def _cogs_from(bot, module_name: str) -> List:
+    return [cog for cog in bot.cogs.values() if type(cog).__module__ == module_name]
+
+
+def _class_map(modules, snapshots: Dict[str, dict]) -> Dict[type, type]:
+    """Old class -> new class for every class defined by the reloaded modules."""
+    class_map = {}
+    for module in modules:
+        for name, old in snapshots[module.__name__].items():
+            new = module.__dict__.get(name)
+            if (isinstance(old, type) and isinstance(new, type) and old is not new
+                    and old.__module__ == module.__name__):
+                class_map[old] = new
+    return class_map
+
+
+def _migrate(class_map: Dict[type, type]):
+    """Swap the class of every live instance of an old class."""
+    migrated, failed = Counter(), Counter()
+    for obj in gc.get_objects():
+        new_class = class_map.get(type(obj))
+        if new_class is None:
+            continue
+        try:
+            obj.__class__ = new_class
+            migrated[new_class.__name__] += 1
+        except TypeError as e:
+            # Incompatible layout (e.g. __slots__ changed); the object keeps the old code
+            failed[new_class.__name__] += 1
+            logger.warning("Could not migrate %r to the new %s: %s", obj, new_class.__name__, e)
+    return dict(migrated), dict(failed)
+
+
+async def _rollback(bot, modules, snapshots: Dict[str, dict], old_cogs: Dict[str, List]):
+    for module_name in old_cogs:
+        for cog in _cogs_from(bot, module_name):
+            await bot.remove_cog(cog.qualified_name)
+    for module, snapshot in zip(modules, snapshots.values()):
+        module.__dict__.clear()
+        module.__dict__.update(snapshot)
+    for cogs in old_cogs.values():
+        for cog in cogs:
+            await bot.add_cog(cog)
+
+
+async def reload_code(bot) -> dict:
+    """Reload player modules and all loaded cogs, migrating live objects.
+    
+    Returns a report of what was reloaded and migrated. Raises ReloadError
+    (after rolling back) if anything fails to load.
+    """
+    async with _lock:
+        started = time.perf_counter()
+        cog_names = sorted(bot.extensions)
+        names = [name for name in RELOADABLE_MODULES if name in sys.modules] + cog_names
+        modules = [sys.modules[name] for name in names]
+        
+        for module in modules:
+            try:
+                _check_source(module)
+            except Exception as e:
+                raise ReloadError(module.__name__, e) from e
+        
+        snapshots = {module.__name__: dict(module.__dict__) for module in modules}
+        old_cogs = {name: _cogs_from(bot, name) for name in cog_names}
+        current = None
+        try:
+            for name in cog_names:
+                current = name
+                for cog in old_cogs[name]:
+                    await bot.remove_cog(cog.qualified_name)
+            for module in modules:
+                current = module.__name__
+                importlib.reload(module)
+            for name in cog_names:
+                current = name
+                await sys.modules[name].setup(bot)
+        except Exception as e:
+            logger.error("Reload failed in %s, rolling back: %s", current, e)
+            await _rollback(bot, modules, snapshots, old_cogs)
+            raise ReloadError(current, e) from e
+        
+        migrated, failed = _migrate(_class_map(modules, snapshots))
+        report = {
+            'modules': [name for name in names if name not in cog_names],
+            'cogs': cog_names,
+            'migrated': migrated,
+            'failed': failed,
+            'seconds': time.perf_counter() - started,
+        }
+        logger.info("Reloaded %d module(s) and %d cog(s) in %.2fs, migrated %s",
+                    len(report['modules']), len(cog_names), report['seconds'], migrated)
+        return report
@@ -0,0 +1,231 @@
+"""Per-guild settings with an in-memory cache and write-behind persistence.
+
+Every guild's settings live in a dict, so the lookups that run on every
+message (``command_prefix``) never touch the database. Changes mark the guild
+dirty and a background task writes dirty guilds to SQLite in batches, in a
+worker thread, so the event loop never waits on disk I/O.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+from typing import Dict, Optional
+
+from utils.config import (
+    BOT_PREFIX, DEFAULT_VOLUME, DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_QUEUE, LOUDNESS_NORMALIZATION,
+    SETTINGS_DB_PATH, SETTINGS_FLUSH_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+_TRUE = ('on', 'true', 'yes', '1', 'enable', 'enabled')
+_FALSE = ('off', 'false', 'no', '0', 'disable', 'disabled')
+
+
+def _parse_bool(value: str) -> bool:
+    value = value.lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError("expected on or off")
+
+
+def _parse_int(low: int, high: int):
+    def parse(value: str) -> int:
+        try:
+            number = int(value.rstrip('%s'))  # Allow "70%" and "180s"
+        except ValueError:
+            raise ValueError("expected a whole number") from None
+        if not low <= number <= high:
+            raise ValueError(f"must be between {low} and {high}")
+        return number
+    return parse
+
+
+def _parse_prefix(value: str) -> str:
+    if not 1 <= len(value) <= 5 or any(c.isspace() for c in value):
+        raise ValueError("must be 1-5 characters without spaces")
+    return value
+
+
+class GuildSettings:
+    """Settings for one guild."""
+    
+    # name -> (parser for command input, description)
+    FIELDS = {
+        'prefix': (_parse_prefix, "Command prefix"),
+        'volume': (_parse_int(0, 100), "Volume new tracks start at (0-100)"),
+        'idle_timeout': (_parse_int(0, 86400), "Seconds alone in voice before leaving (0 = never)"),
+        'max_queue': (_parse_int(0, 10000), "Maximum queued tracks (0 = unlimited)"),
+        'dedupe': (_parse_bool, "Skip tracks that are already queued"),
+        'fair_share': (_parse_bool, "Interleave the queue across requesters"),
+        'normalize': (_parse_bool, "Even out loudness between tracks"),
+    }
+    # Saved with the settings but changed by their own commands rather than !set
+    INTERNAL = ('fair_weights',)
+    
+    def __init__(self, prefix: str = BOT_PREFIX, volume: int = DEFAULT_VOLUME,
+                 idle_timeout: int = DEFAULT_IDLE_TIMEOUT, max_queue: int = DEFAULT_MAX_QUEUE,
+                 dedupe: bool = False, fair_share: bool = False, normalize: bool = LOUDNESS_NORMALIZATION,
+                 fair_weights: Optional[Dict[int, int]] = None):
+        self.prefix = prefix
+        self.volume = volume
+        self.idle_timeout = idle_timeout
+        self.max_queue = max_queue
+        self.dedupe = dedupe
+        self.fair_share = fair_share
+        self.normalize = normalize
+        self.fair_weights = dict(fair_weights or {})  # Member ID -> turns per round (!fairweight)
+    
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in (*self.FIELDS, *self.INTERNAL)}
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'GuildSettings':
+        # Ignore settings removed since the row was written
+        values = {name: value for name, value in data.items() if name in cls.FIELDS or name in cls.INTERNAL}
+        if 'fair_weights' in values:
+            # JSON object keys are strings
+            values['fair_weights'] = {int(member_id): weight for member_id, weight in values['fair_weights'].items()}
+        return cls(**values)
+    
+    def copy(self) -> 'GuildSettings':
+        return GuildSettings(**self.to_dict())
+
+
+def parse_setting(name: str, value: str):
+    """Validate a setting from command input, raising ValueError with a user-facing reason."""
+    if name not in GuildSettings.FIELDS:
+        raise ValueError(f"unknown setting `{name}`")
+    parser, _ = GuildSettings.FIELDS[name]
+    return parser(value)
+
+
+class SettingsStore:
+    """In-memory per-guild settings, persisted to SQLite by a write-behind task."""
+    
+    def __init__(self, path: str = SETTINGS_DB_PATH, flush_interval: float = SETTINGS_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.defaults = GuildSettings()  # Shared by guilds without overrides; never mutated
+        self._cache: Dict[int, GuildSettings] = {}
+        self._dirty = set()
+        self._db: Optional[sqlite3.Connection] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._flush_lock = asyncio.Lock()  # One batch at a time on the connection
+    
+    def get(self, guild_id: int) -> GuildSettings:
+        """Settings for a guild (the shared defaults if it has none). Treat as read-only."""
+        return self._cache.get(guild_id, self.defaults)
+    
+    def update(self, guild_id: int, **changes) -> GuildSettings:
+        """Change settings for a guild; the new values are persisted in the next batch."""
+        settings = self._cache.get(guild_id)
+        if settings is None:
+            settings = self._cache[guild_id] = self.defaults.copy()
+        for name, value in changes.items():
+            if name not in GuildSettings.FIELDS and name not in GuildSettings.INTERNAL:
+                raise KeyError(name)
+            setattr(settings, name, value)
+        self._mark_dirty(guild_id)
+        return settings
+    
+    def reset(self, guild_id: int, name: Optional[str] = None) -> GuildSettings:
+        """Restore one setting, or all of a guild's settings, to the defaults."""
+        if name is None:
+            self._cache.pop(guild_id, None)
+            self._mark_dirty(guild_id)
+            return self.defaults
+        return self.update(guild_id, **{name: getattr(self.defaults, name)})
+    
+    def _mark_dirty(self, guild_id: int):
+        self._dirty.add(guild_id)
+        if self._wake:
+            self._wake.set()
+    
+    async def start(self):
+        """Open the database, load every guild into memory and start the flusher."""
+        await asyncio.to_thread(self._open)
+        rows = await asyncio.to_thread(self._load)
+        for guild_id, data in rows:
+            try:
+                self._cache[guild_id] = GuildSettings.from_dict(json.loads(data))
+            except (TypeError, ValueError) as e:
+                logger.warning("Ignoring unreadable settings for guild %s: %s", guild_id, e)
+        logger.info("Loaded settings for %d guild(s) from %s", len(self._cache), self.path)
+        
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def close(self):
+        """Stop the flusher and write any pending changes."""
+        if self._flusher:
+            # Not cancelled: a batch already running in a worker thread would keep going
+            # and overlap the final flush. The loop writes what is pending and exits.
+            self._stop.set()
+            self._wake.set()
+            await self._flusher
+            self._flusher = None
+        if self._db:
+            await self.flush()
+            await asyncio.to_thread(self._db.close)
+            self._db = None
+    
+    async def _flush_loop(self):
+        while not self._stop.is_set():
+            await self._wake.wait()
+            # Let further changes accumulate so they go out in one transaction (close cuts this short)
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Failed to persist guild settings: %s", e)
+                self._wake.set()  # Retry after the next interval
+    
+    async def flush(self):
+        """Write all dirty guilds to the database in one batch."""
+        async with self._flush_lock:
+            await self._flush()
+    
+    async def _flush(self):
+        if not self._dirty or not self._db:
+            return
+        batch, self._dirty = self._dirty, set()
+        upserts = [
+            (guild_id, json.dumps(self._cache[guild_id].to_dict()))
+            for guild_id in batch if guild_id in self._cache
+        ]
+        deletes = [(guild_id,) for guild_id in batch if guild_id not in self._cache]
+        try:
+            await asyncio.to_thread(self._write, upserts, deletes)
+        except BaseException:
+            # Keep the changes (also on cancellation) so the next flush retries them
+            self._dirty |= batch
+            raise
+        logger.debug("Persisted settings for %d guild(s)", len(batch))
+    
+    def _open(self):
+        # Only ever used from one worker thread at a time (start, then serialized flushes)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS guild_settings (guild_id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        self._db.commit()
+    
+    def _load(self):
+        return self._db.execute("SELECT guild_id, data FROM guild_settings").fetchall()
+    
+    def _write(self, upserts, deletes):
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO guild_settings (guild_id, data) VALUES (?, ?)", upserts
+            )
+            self._db.executemany("DELETE FROM guild_settings WHERE guild_id = ?", deletes)
@@ -0,0 +1,249 @@
+"""Lightweight span-based tracing for command pipelines.
+
+A trace is opened around each sampled command invocation and shared through a
+context variable, so every stage below it (voice connect, extraction, FFmpeg
+spawn, ...) can record a span without passing the trace around explicitly.
+``asyncio.to_thread`` copies the context, so spans also work inside worker
+threads. A trace is complete once the command returned and every span it
+opened has finished; spans like the first audio packet may finish later, from
+the audio thread.
+
+Completed traces are kept in memory for the ``!traces`` owner command and
+exported as JSON lines to a file and/or an HTTP collector from a background
+thread.
+"""
+import contextvars
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+
+from utils.config import TRACE_SAMPLE_RATE, TRACE_EXPORT_PATH, TRACE_COLLECTOR_URL
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('current_trace', default=None)
+
+
+class Span:
+    """A timed stage within a trace."""
+    
+    def __init__(self, trace: 'Trace', name: str, attrs: dict,
+                 offset: Optional[float] = None, duration: Optional[float] = None):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self._started = time.perf_counter()
+        # Offset from the start of the trace, in seconds
+        self.offset = offset if offset is not None else self._started - trace._started
+        self.duration = duration
+    
+    @property
+    def finished(self) -> bool:
+        return self.duration is not None
+    
+    def finish(self, **attrs):
+        """End the span. Safe to call more than once and from any thread."""
+        with self.trace._lock:
+            if self.duration is not None:
+                return
+            self.duration = time.perf_counter() - self._started
+            self.attrs.update(attrs)
+        self.trace._release()
+    
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'offset_ms': round(self.offset * 1000, 2),
+            'duration_ms': round(self.duration * 1000, 2) if self.duration is not None else None,
+            'attrs': self.attrs,
+        }
+
+
+class Trace:
+    """A request made of spans that share one trace ID."""
+    
+    def __init__(self, tracer: 'Tracer', name: str, attrs: dict):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.timestamp = time.time()
+        self.spans: List[Span] = []
+        self.duration: Optional[float] = None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._pending = 1  # The trace itself counts until finish() is called
+        self._root_finished = False
+    
+    def start_span(self, name: str, **attrs) -> Span:
+        """Open a span; the caller must finish() it."""
+        span = Span(self, name, attrs)
+        with self._lock:
+            self.spans.append(span)
+            self._pending += 1
+        return span
+    
+    def add_span(self, name: str, offset: float, duration: float, **attrs):
+        """Record an already-measured span (e.g. gateway dispatch before the trace began)."""
+        with self._lock:
+            self.spans.append(Span(self, name, attrs, offset=offset, duration=duration))
+    
+    def finish(self):
+        """Mark the request as returned; the trace completes once all spans finished."""
+        with self._lock:
+            if self._root_finished:
+                return
+            self._root_finished = True
+        self._release()
+    
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            if self._pending > 0:
+                return
+            self.duration = max(
+                [time.perf_counter() - self._started] +
+                [span.offset + span.duration for span in self.spans]
+            ) - min([0.0] + [span.offset for span in self.spans])
+        self.tracer._complete(self)
+    
+    def stage_totals(self) -> dict:
+        """Total time per span name, in seconds."""
+        totals = {}
+        for span in self.spans:
+            if span.duration is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+    
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'timestamp': self.timestamp,
+            'duration_ms': round(self.duration * 1000, 2) if self.duration is not None else None,
+            'attrs': self.attrs,
+            'spans': [span.to_dict() for span in self.spans],
+        }
+
+
+class Tracer:
+    """Samples traces, keeps recent ones in memory and exports completed ones."""
+    
+    def __init__(self, sample_rate: float = 0.0, export_path: Optional[str] = None,
+                 collector_url: Optional[str] = None, keep: int = 200):
+        self.sample_rate = sample_rate
+        self.export_path = export_path
+        self.collector_url = collector_url
+        self.recent = deque(maxlen=keep)
+        self._export_queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._export_thread: Optional[threading.Thread] = None
+        self._export_lock = threading.Lock()
+    
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Open a sampled trace for the enclosed block (yields None when not sampled)."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            yield None
+            return
+        
+        trace = Trace(self, name, attrs)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+    
+    def slowest(self, count: int = 5) -> List[Trace]:
+        """Slowest recently completed traces."""
+        return sorted(self.recent, key=lambda t: t.duration or 0.0, reverse=True)[:count]
+    
+    def _complete(self, trace: Trace):
+        self.recent.append(trace)
+        if not (self.export_path or self.collector_url):
+            return
+        try:
+            self._export_queue.put_nowait(json.dumps(trace.to_dict(), default=str))
+        except queue.Full:
+            return  # Drop rather than slow down playback
+        self._ensure_export_thread()
+    
+    def _ensure_export_thread(self):
+        with self._export_lock:
+            if self._export_thread is None:
+                self._export_thread = threading.Thread(
+                    target=self._export_worker, name='trace-exporter', daemon=True
+                )
+                self._export_thread.start()
+    
+    def _export_worker(self):
+        """Write completed traces in batches, off the event loop."""
+        while True:
+            batch = [self._export_queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._export_queue.get_nowait())
+                except queue.Empty:
+                    break
+            payload = '\n'.join(batch) + '\n'
+            
+            if self.export_path:
+                try:
+                    with open(self.export_path, 'a', encoding='utf-8') as f:
+                        f.write(payload)
+                except OSError as e:
+                    logger.warning("Failed to write traces to %s: %s", self.export_path, e)
+            
+            if self.collector_url:
+                try:
+                    request = urllib.request.Request(
+                        self.collector_url,
+                        data=payload.encode('utf-8'),
+                        headers={'Content-Type': 'application/x-ndjson'},
+                        method='POST'
+                    )
+                    urllib.request.urlopen(request, timeout=5).close()
+                except Exception as e:
+                    logger.warning("Failed to send traces to %s: %s", self.collector_url, e)
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace of the request being handled, if it is sampled."""
+    return _current_trace.get()
+
+
+def start_span(name: str, **attrs) -> Optional[Span]:
+    """Open a span in the current trace, for spans that end elsewhere (e.g. another thread)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    return trace.start_span(name, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record the enclosed block as a span of the current trace (no-op when untraced)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    
+    current = trace.start_span(name, **attrs)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs['error'] = repr(e)
+        raise
+    finally:
+        current.finish()
+
+
+tracer = Tracer(TRACE_SAMPLE_RATE, TRACE_EXPORT_PATH, TRACE_COLLECTOR_URL)
@@ -0,0 +1,261 @@
+"""Track queues with an index of the canonical URLs they contain."""
+import heapq
+from collections import deque
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+_YOUTUBE_PATH_PREFIXES = ('/shorts/', '/embed/', '/live/', '/v/')
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a track URL so different links to the same media compare equal.
+    
+    YouTube links (watch, youtu.be, shorts, music, mobile) collapse to the
+    video ID, SoundCloud links drop query strings and case, and other URLs
+    lose their scheme, ``www.`` and trailing slash.
+    """
+    if not url:
+        return ''
+    url = url.strip()
+    parsed = urlparse(url)
+    if not parsed.netloc:
+        return url
+    
+    host = parsed.netloc.lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = parsed.path.rstrip('/')
+    
+    video_id = None
+    if host == 'youtu.be':
+        video_id = path.lstrip('/')
+    elif host == 'youtube.com':
+        if path == '/watch':
+            video_id = parse_qs(parsed.query).get('v', [None])[0]
+        elif path.startswith(_YOUTUBE_PATH_PREFIXES):
+            video_id = path.split('/')[2]
+    if video_id:
+        return f'youtube:{video_id}'
+    
+    if host == 'soundcloud.com':
+        return f'soundcloud:{path.lower()}'
+    
+    return f'{host}{path}' + (f'?{parsed.query}' if parsed.query else '')
+
+
+class TrackQueue:
+    """FIFO queue of tracks that keeps a count of each canonical URL it holds.
+    
+    Every mutation goes through this class so ``contains`` stays an O(1)
+    lookup instead of a scan of the queue.
+    """
+    
+    def __init__(self):
+        self._tracks: deque = deque()
+        self._index: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self._tracks)
+    
+    def __bool__(self) -> bool:
+        return bool(self._tracks)
+    
+    def __iter__(self) -> Iterator:
+        return iter(self._tracks)
+    
+    def _add_key(self, track):
+        key = track.canonical_url
+        self._index[key] = self._index.get(key, 0) + 1
+    
+    def _rebuild_index(self, tracks):
+        self._index = {}
+        for track in tracks:
+            self._add_key(track)
+    
+    def _remove_key(self, track):
+        key = track.canonical_url
+        count = self._index.get(key, 0) - 1
+        if count > 0:
+            self._index[key] = count
+        else:
+            self._index.pop(key, None)
+    
+    def contains(self, url: str) -> bool:
+        """Whether a track with this (canonical) URL is queued."""
+        return canonical_url(url) in self._index
+    
+    def append(self, track):
+        self._tracks.append(track)
+        self._add_key(track)
+    
+    def appendleft(self, track):
+        self._tracks.appendleft(track)
+        self._add_key(track)
+    
+    def popleft(self):
+        track = self._tracks.popleft()
+        self._remove_key(track)
+        return track
+    
+    def clear(self):
+        self._tracks.clear()
+        self._index.clear()
+    
+    def peek(self, count: int) -> List:
+        """The next count tracks, in play order."""
+        return list(islice(self._tracks, count))
+    
+    def copy(self) -> List:
+        return list(self._tracks)
+    
+    def remove_duplicates(self, current: Optional[object] = None) -> int:
+        """Drop repeated tracks (and repeats of ``current``), keeping first occurrences."""
+        seen = {current.canonical_url} if current else set()
+        kept = deque()
+        for track in self._tracks:
+            if track.canonical_url not in seen:
+                seen.add(track.canonical_url)
+                kept.append(track)
+        
+        removed = len(self._tracks) - len(kept)
+        if removed:
+            self._tracks = kept
+            self._rebuild_index(kept)
+        return removed
+
+
+class FairTrackQueue(TrackQueue):
+    """Queue that interleaves tracks across requesters (stride scheduling).
+    
+    Each requester has their own FIFO lane. The lane with the lowest "pass"
+    plays next, and playing a track advances the lane's pass by
+    ``1 / weight``, so a requester with weight 2 gets two turns for everyone
+    else's one. Lanes sit in a heap, making next-track selection O(log
+    requesters) however long the queue is. A lane that goes idle rejoins at
+    the current virtual time, so it can't bank turns while empty.
+    
+    Tracks pushed with ``appendleft`` (loop mode) bypass the lanes and play
+    first, as with the FIFO queue.
+    """
+    
+    def __init__(self, weights: Optional[Dict[object, int]] = None):
+        super().__init__()
+        self.weights = weights if weights is not None else {}
+        self._front: deque = deque()
+        self._lanes: Dict[object, deque] = {}
+        self._passes: Dict[object, float] = {}
+        self._heap: List[tuple] = []  # (pass, seq, requester key) per non-empty lane
+        self._next_seq = 0
+        self._virtual_time = 0.0
+        self._size = 0
+    
+    @staticmethod
+    def requester_key(track):
+        return track.requester.id if track.requester else None
+    
+    def _stride(self, key) -> float:
+        return 1.0 / max(self.weights.get(key, 1), 1)
+    
+    def _push_lane(self, key, pass_value: float):
+        # The sequence number breaks ties in arrival order, which makes equal weights round-robin
+        heapq.heappush(self._heap, (pass_value, self._next_seq, key))
+        self._next_seq += 1
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __bool__(self) -> bool:
+        return self._size > 0
+    
+    def __iter__(self) -> Iterator:
+        return iter(self.peek(self._size))
+    
+    def append(self, track):
+        key = self.requester_key(track)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            self._passes[key] = max(self._passes.get(key, 0.0), self._virtual_time)
+            self._push_lane(key, self._passes[key])
+        lane.append(track)
+        self._size += 1
+        self._add_key(track)
+    
+    def appendleft(self, track):
+        self._front.appendleft(track)
+        self._size += 1
+        self._add_key(track)
+    
+    def popleft(self):
+        if self._front:
+            track = self._front.popleft()
+        else:
+            if not self._heap:
+                raise IndexError('pop from an empty queue')
+            pass_value, _, key = heapq.heappop(self._heap)
+            self._virtual_time = pass_value
+            lane = self._lanes[key]
+            track = lane.popleft()
+            self._passes[key] = pass_value + self._stride(key)
+            if lane:
+                self._push_lane(key, self._passes[key])
+            else:
+                del self._lanes[key]
+        self._size -= 1
+        self._remove_key(track)
+        return track
+    
+    def clear(self):
+        super().clear()
+        self._front.clear()
+        self._lanes.clear()
+        self._passes.clear()
+        self._heap.clear()
+        self._virtual_time = 0.0
+        self._size = 0
+    
+    def peek(self, count: int) -> List:
+        """The next count tracks, in the order ``popleft`` will return them."""
+        upcoming = list(islice(self._front, count))
+        heap = list(self._heap)
+        seq = self._next_seq
+        lanes = {key: iter(lane) for key, lane in self._lanes.items()}
+        remaining = {key: len(lane) for key, lane in self._lanes.items()}
+        while len(upcoming) < count and heap:
+            pass_value, _, key = heapq.heappop(heap)
+            upcoming.append(next(lanes[key]))
+            remaining[key] -= 1
+            if remaining[key]:
+                heapq.heappush(heap, (pass_value + self._stride(key), seq, key))
+                seq += 1
+        return upcoming
+    
+    def copy(self) -> List:
+        return self.peek(self._size)
+    
+    def remove_duplicates(self, current: Optional[object] = None) -> int:
+        """Drop repeats in play order, keeping each track's first scheduled occurrence."""
+        seen = {current.canonical_url} if current else set()
+        kept = set()
+        for track in self.peek(self._size):
+            if track.canonical_url not in seen:
+                seen.add(track.canonical_url)
+                kept.add(id(track))
+        
+        removed = self._size - len(kept)
+        if removed:
+            self._front = deque(t for t in self._front if id(t) in kept)
+            for key in list(self._lanes):
+                lane = deque(t for t in self._lanes[key] if id(t) in kept)
+                if lane:
+                    self._lanes[key] = lane
+                else:
+                    del self._lanes[key]
+            # Surviving lanes keep their pass and tie-break order
+            self._heap = [entry for entry in self._heap if entry[2] in self._lanes]
+            heapq.heapify(self._heap)
+            self._size = len(kept)
+            self._rebuild_index(self.peek(self._size))
+        return removed